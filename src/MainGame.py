@@ -8,28 +8,95 @@ the game it will display a congratulation sign.
 """
 
 from everythingbutmain.Sprites import Avatar, AnimationSequence
-from everythingbutmain.FunkyFeatures import Artifacts, NPCs, NPCMessage
-from everythingbutmain.AdvancedMovement import Ghosts, ObstacleFloat
+from everythingbutmain.FunkyFeatures import Artifacts, NPCs, NPCMessage, SPAWN_REGIONS
+from everythingbutmain.FreeSpace import FreeSpaceIndex
+from everythingbutmain.AdvancedMovement import Ghosts
+from everythingbutmain.Particles import ParticleSystem
+from everythingbutmain.TileChunks import TileChunks
+from everythingbutmain.SolidGrid import SolidGrid, StreamedSolidGrid
+from everythingbutmain.MapFormat import load_map
+from everythingbutmain.Audio import SoundBank, JUMP_SOUND, FALL_SOUND
+from everythingbutmain.Profiler import FrameProfiler
+from everythingbutmain.Compositor import Compositor
+from everythingbutmain.Broadphase import SpatialHash
+from everythingbutmain.TextCache import TEXT
+from everythingbutmain.Levels import LevelManager, LEVEL_MUSIC, LEVEL_ASSETS, COMMON_ASSETS, NEXT_LEVEL
+from everythingbutmain.Prefetch import LevelPrefetcher
 from TitleScreen import Title
-from loadingpics import load_picture, load_pictures
+from loadingpics import load_picture, load_pictures, load_mirrored_picture, LevelResources
 import sys
 import json
+import random
+import time
 import pygame
 
 
 ADJACENT_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone', 'cloud', 'magma'}
+PROFILE_CSV = 'frame_profile.csv'
+WINDOW_SIZE = (640, 480)
+RENDER_SIZE = (320, 240)  # the size the game is drawn at before it is scaled up to the window
+STREAM_MARGIN = 128  # pixels around the camera whose map chunks are read ahead on a streamed map
+DECOR_CELL_SIZE = 128  # pixels, size of the cells of the spatial hash that holds the offgrid decor
+TICK_RATE = 60  # simulation ticks per second
+SPEED_TICK_RATE = 60  # the speeds in the game (gravity, jumps, enemies...) are how far things move in 1/60 s
+MAX_TICKS_PER_FRAME = 5  # when a frame is later than this the game slows down instead of freezing
+
+# the picture (or folder of pictures) of each resource and how to load it, they are only loaded when a level needs
+# them (see LEVEL_ASSETS)
+RESOURCE_LOADERS = {
+    'decor': ('tiles/decor', load_pictures),
+    'grass': ('tiles/grass', load_pictures),
+    'large_decor': ('tiles/large_decor', load_pictures),
+    'stone': ('tiles/stone', load_pictures),
+    'lava': ('tiles/lava', load_pictures),
+    'magma': ('tiles/magma', load_pictures),
+    'player': ('entities/player/player.png', load_picture),
+
+    'background': ('background.jpg', load_picture),
+    'forest-background': ('forest-background.png', load_picture),
+    'heaven-sunset': ('heaven-sunset.png', load_picture),
+    'hell': ('hell-landscape.png', load_picture),
+
+    'water': ('tiles/water', load_pictures),
+    'artifacts': ('artifacts', load_pictures),
+    'cloud': ('tiles/cloud', load_pictures),
+
+    'player/thing': ('entities/player/thing', lambda path: AnimationSequence(load_pictures(path))),
+    'player/run': ('entities/player/run', lambda path: AnimationSequence(load_pictures(path), 4)),
+
+    'NPC/tomato': ('entities/NPC/tomato', lambda path: AnimationSequence(load_pictures(path))),
+    'NPC/Chipmunk': ('entities/NPC/Chipmunk', lambda path: AnimationSequence(load_pictures(path))),
+    'NPC/willowisp': ('entities/NPC/willowisp', lambda path: AnimationSequence(load_pictures(path))),
+    'NPC/fluffy': ('entities/NPC/fluffy', lambda path: AnimationSequence(load_pictures(path))),
+
+    'player/idle': ('entities/player/idle', lambda path: AnimationSequence(load_pictures(path), 4)),
+    'player/jump': ('entities/player/jump', lambda path: AnimationSequence(load_pictures(path), 4)),
+    'float': ('float', load_pictures),
+
+    'ghost/down': ('entities/ghost/down', lambda path: AnimationSequence(load_pictures(path), 0.5)),
+    'ghost/up': ('entities/ghost/up', lambda path: AnimationSequence(load_pictures(path), 0.5)),
+    'ghost/left': ('entities/ghost/left', lambda path: AnimationSequence(load_pictures(path), 0.5)),
+    'ghost/right': ('entities/ghost/right', lambda path: AnimationSequence(load_pictures(path), 0.5)),
+    'seaMonster': ('entities/seaMonster/0.png', load_picture),
+    'dove': ('entities/dove/0.png', load_picture),
+    'dragon': ('entities/dragon/0.png', load_picture),
+    'seaMonster/flipped': ('entities/seaMonster/0.png', load_mirrored_picture),
+    'dove/flipped': ('entities/dove/0.png', load_mirrored_picture),
+    'dragon/flipped': ('entities/dragon/0.png', load_mirrored_picture),
+}
 
 
 
 class Adventure:
-    def __init__(self, currentMap='heaven.json'): # change the name of the starting map here
+    def __init__(self, currentMap='heaven.json', frame_rate=60, seed=None, tick_rate=TICK_RATE,
+                 continuous_collision=True, window_size=WINDOW_SIZE, scale=None): # change the name of the starting map here
         """Loads in everything for the game and runs the entire game."""
         pygame.init()
         pygame.display.set_caption('Dog\'s Journey Home')
 # Music
-        self.channel1 = pygame.mixer.Channel(0)
-        self.channel1.set_volume(0.4)  # Set volume to 40% of maximum (0.2 is 20%)
+        # the background music is streamed, the short sounds are decoded once here
+        self.sounds = SoundBank()
         
         # for the sounds jumping and falling
         self.channel2 = pygame.mixer.Channel(1)
@@ -38,77 +105,71 @@ class Adventure:
         self.channel3 = pygame.mixer.Channel(2)
         self.channel3.set_volume(0.1)
 
-        self.currentMap = currentMap
-        if self.currentMap == 'heaven.json':
-            self.channel1.play(pygame.mixer.Sound('artifacts/heaven.mp3'), loops=1) # loops 2 times
-        if self.currentMap == 'hell.json':
-            self.channel1.play(pygame.mixer.Sound('artifacts/hell.mp3'), loops=1)
-        if self.currentMap == 'map.json':
-            self.channel1.play(pygame.mixer.Sound('artifacts/backgroundmusic.mp3'), loops=1)
-        if self.currentMap == 'map2.json':
-            self.channel1.play(pygame.mixer.Sound('artifacts/earth.mp3'), loops=1)
-        
+        self.starting_map = currentMap
+        self.currentMap = None
+        self.levels = LevelManager(self)
+
 # for the game
         self.tile_dimension = 16
-        self.tile_layout = {}
-        self.exterior_tiles = []
-        self.window = pygame.display.set_mode((640, 480))
-        self.render_surface = pygame.Surface((320, 240))
+        self.tile_map = None
+        self.window_size = window_size
+        self.scale = scale  # a whole number, None uses the biggest one that fits the window
+        self.window = pygame.display.set_mode(self.window_size)
+        self.compositor = Compositor(self.window, self.scale)  # the only thing that sends frames to the display
+        self.render_surface = pygame.Surface(RENDER_SIZE)
         self.character_type = 'avatar'
         self.timer = pygame.time.Clock()
-        self.movement_status = [False, False]
-        self.resources = {
-            'decor': load_pictures('tiles/decor'),
-            'grass': load_pictures('tiles/grass'),
-            'large_decor': load_pictures('tiles/large_decor'),
-            'stone': load_pictures('tiles/stone'),
-            'lava': load_pictures('tiles/lava'),
-            'magma': load_pictures('tiles/magma'),
-            'player': load_picture('entities/player/player.png'),
-            
-            'background': load_picture('background.jpg'),
-            'forest-background': load_picture('forest-background.png'),
-            'heaven-sunset': load_picture('heaven-sunset.png'),
-            'hell': load_picture('hell-landscape.png'),
-
-            'water': load_pictures('tiles/water'),
-            'artifacts': load_pictures('artifacts'),
-            'cloud': load_pictures('tiles/cloud'),
-
-            'player/thing': AnimationSequence(load_pictures('entities/player/thing')),
-            'player/run': AnimationSequence(load_pictures('entities/player/run'), 4),
-            
-            'NPC/tomato': AnimationSequence(load_pictures('entities/NPC/tomato')),
-            'NPC/Chipmunk': AnimationSequence(load_pictures('entities/NPC/Chipmunk')),
-            'NPC/willowisp':AnimationSequence(load_pictures('entities/NPC/willowisp')),
-            'NPC/fluffy':AnimationSequence(load_pictures('entities/NPC/fluffy')),
-            
-            'player/idle': AnimationSequence(load_pictures('entities/player/idle'), 4),
-            'player/jump': AnimationSequence(load_pictures('entities/player/jump'), 4),
-            'float': load_pictures('float'),
-            
-            'ghost/down': AnimationSequence(load_pictures('entities/ghost/down'), 0.5),
-            'ghost/up': AnimationSequence(load_pictures('entities/ghost/up'), 0.5),
-            'ghost/left': AnimationSequence(load_pictures('entities/ghost/left'), 0.5),
-            'ghost/right': AnimationSequence(load_pictures('entities/ghost/right'), 0.5),
-            'seaMonster': load_picture('entities/seaMonster/0.png'),
-            'dove': load_picture('entities/dove/0.png'),
-            'dragon': load_picture('entities/dragon/0.png'),
-        }
-        self.load_game('src/' + self.currentMap)
+        self.frame_rate = frame_rate  # how often the screen is drawn
+        # the game moves forward in fixed ticks no matter how fast the frames are drawn
+        self.tick_rate = tick_rate
+        self.tick_length = 1 / tick_rate
+        self.tick_scale = SPEED_TICK_RATE / tick_rate  # how many 1/60 s steps one tick is
+        self.camera_follow = 1 - (1 - 1 / 30) ** self.tick_scale  # the camera closes 1/30 of the gap every 1/60 s
+        self.accumulator = 0.0
+        # sweep the player through the tiles instead of pushing it out afterwards, so it can not pass through thin
+        # platforms at low tick rates or high speeds
+        self.continuous_collision = continuous_collision
+        self.last_step = None
+        # give a seed to get the same bone spots every time
+        self.rng = random.Random(seed) if seed is not None else random
+        self.free_space = None
+        self.profiler = FrameProfiler()  # F3 shows the frame times, F4 writes them to PROFILE_CSV
+        self.resources = LevelResources(RESOURCE_LOADERS)
+        self.prefetcher = LevelPrefetcher(self.resources)  # loads the next level while this one is played
+        self.load_level(self.starting_map)
+
+    def load_level(self, currentMap):
+        """Swaps in the map, the music and the entities of a level without reloading the pictures."""
+        self.currentMap = currentMap
+        prefetched = self.prefetcher.take(self.currentMap)  # the map, music and decoded pictures, if ready
+        tile_map, music = prefetched if prefetched is not None else (None, None)
+        self.resources.use(COMMON_ASSETS + LEVEL_ASSETS[self.currentMap])
+        self.sounds.play_music(LEVEL_MUSIC[self.currentMap], loops=1, data=music)  # loops 2 times
+        self.load_game('src/' + self.currentMap, tile_map)
+        self.respawn()
+        self.prefetcher.prefetch(NEXT_LEVEL[self.currentMap])
+
+    def respawn(self):
+        """Puts the player and the entities of the current level back where they start."""
         self.scroll_offset = [0, 0]
+        self.previous_scroll = [0, 0]
+        self.talking = False
+        self.movement_status = [False, False]
+        self.banner_shown = False
+        self.broadphase = SpatialHash()  # the bones, enemies and NPC register themselves here
         self.avatar = Avatar(self, 'player', (0, 0), (10, 10), 'thing')
         self.artifacts = Artifacts(self)
-        self.chipmunk = NPCs(self, 'NPC/Chipmunk', (742, 6), (16, 16))
-
-        self.tomato = NPCs(self, 'NPC/tomato', (419, 86.1), (16, 16))
-        self.wisp = NPCs(self, 'NPC/willowisp', (1359, -26.2), (18, 18)) # this controls where it is
-        self.fluffy = NPCs(self, 'NPC/fluffy', (640, 231), (30, 30))
+        # only the NPC of the current level is made so the other NPC sprites do not have to be loaded
+        self.chipmunk = self.tomato = self.wisp = self.fluffy = None
+        if self.currentMap == 'map2.json':
+            self.chipmunk = NPCs(self, 'NPC/Chipmunk', (742, 6), (16, 16))
+        if self.currentMap == 'map.json':
+            self.tomato = NPCs(self, 'NPC/tomato', (419, 86.1), (16, 16))
+        if self.currentMap == 'heaven.json':
+            self.wisp = NPCs(self, 'NPC/willowisp', (1359, -26.2), (18, 18)) # this controls where it is
+        if self.currentMap == 'hell.json':
+            self.fluffy = NPCs(self, 'NPC/fluffy', (640, 231), (30, 30))
         self.current_animation = self.resources['player/thing'].duplicate()
-        self.current_animation_Chipmunk = self.resources['NPC/Chipmunk'].duplicate()
-        self.current_animation_tomato = self.resources['NPC/tomato'].duplicate()
-        self.current_animation_wisp = self.resources['NPC/willowisp'].duplicate()
-        self.current_animation_fluffy = self.resources['NPC/fluffy'].duplicate()
         self.current_action = 'thing'
         if self.currentMap == 'heaven.json':
             self.message = NPCMessage(self, 1359, -100, False)
@@ -119,17 +180,7 @@ class Adventure:
         if self.currentMap == 'map2.json':
             self.message = NPCMessage(self, 770, -20, False)
         self.ghosts = Ghosts(self)
-        self.obstacle = ObstacleFloat(self, 'float')
-
-    def surrounding_tiles(self, position):
-        """Makes sure none of the tiles are on top of each other."""
-        tiles = []
-        tile_position = (int(position[0] // self.tile_dimension), int(position[1] // self.tile_dimension))
-        for offset in ADJACENT_OFFSETS:
-            check_position = str(tile_position[0] + offset[0]) + ';' + str(tile_position[1] + offset[1])
-            if check_position in self.tile_layout:
-                tiles.append(self.tile_layout[check_position])
-        return tiles
+        self.particles = ParticleSystem(self)  # the falling leaves and the other particles of the level
 
     def display_congratulations(self, screen):
         """Render the congratulations banner."""
@@ -140,9 +191,8 @@ class Adventure:
         pygame.draw.rect(screen, pygame.Color('gold'), banner_rect)
         pygame.draw.rect(screen, pygame.Color('black'), banner_rect, 5)  # Border
 
-        # Render text
-        font = pygame.font.SysFont('Arial', 17, bold=True)  # size was 15
-        text_surface = font.render("Congratulations! You reached home!", True, pygame.Color('black'))
+        # Render text (only the first time, after that it comes from the text cache)
+        text_surface = TEXT.render("Congratulations! You reached home!", 'Arial', 17, 'black', bold=True)  # size was 15
         text_rect = text_surface.get_rect(center=banner_rect.center)
 
         # Display text
@@ -151,158 +201,277 @@ class Adventure:
     def save_game(self, file):
         """Allows the dimensions and exterior tiles to be added to the map."""
         f = open(file, 'w')
-        json.dump({'tile_layout': self.tile_layout, 'tile_dimension': self.tile_dimension,
-                   'exterior_tiles': self.exterior_tiles}, f)
+        level_data = self.tile_map.to_json()
+        json.dump({'tile_layout': level_data['tilemap'], 'tile_dimension': self.tile_dimension,
+                   'exterior_tiles': level_data['offgrid']}, f)
         f.close()
 
-    def load_game(self, file):
-        """Loads in the map."""
-        f = open(file, 'r')
-        level_data = json.load(f)
-        f.close()
-        self.tile_layout = level_data['tilemap']
-        self.tile_dimension = level_data['tile_size']
-        self.exterior_tiles = level_data['offgrid']
+    def load_game(self, file, tile_map=None):
+        """Loads in the map (or uses tile_map when it was already read by the prefetcher). A compiled .djmap of the
+        map is used instead when there is one (see compile_maps.py)."""
+        self.tile_map = tile_map if tile_map is not None else load_map(file)
+        self.tile_dimension = self.tile_map.tile_size
+        self.tile_chunks = TileChunks(self.tile_map, self.resources)
+        if self.tile_map.streamed:  # a .djworld map is read a chunk at a time (see ChunkedMap.py)
+            self.solid_grid = StreamedSolidGrid(self.tile_map, PHYSICS_TILES, ADJACENT_OFFSETS)
+        else:
+            self.solid_grid = SolidGrid(self.tile_map, PHYSICS_TILES, ADJACENT_OFFSETS)
+        self.free_space = None  # built the first time bones are placed on this map
+        self.decor = None  # spatial hash of the offgrid decor, built the first time the map is drawn
+
+    def set_tile(self, x, y, tile=None):
+        """Changes (or removes when tile is None) the tile at a grid position and re-bakes its chunk."""
+        if tile is None:
+            self.tile_map.set(x, y, None)
+        else:
+            self.tile_map.set(x, y, tile['type'], tile['variant'])
+        self.tile_chunks.invalidate(x, y)
+        self.solid_grid.set_solid(x, y, tile is not None and tile['type'] in PHYSICS_TILES)
+        self.free_space = None  # the free spots are found again the next time bones are placed
+
+    def spawn_index(self):
+        """Gives the free spots of the current map where bones can go, finding them the first time it is needed."""
+        if self.free_space is None:
+            self.free_space = FreeSpaceIndex(self.solid_grid, SPAWN_REGIONS[self.currentMap])
+        return self.free_space
+
+    def decor_rect(self, tile):
+        """Gives the rectangle an offgrid tile covers when it is drawn."""
+        picture = self.resources[tile['type']][tile['variant']]
+        # one pixel more on each side so rounding the position when blitting never leaves a visible edge out
+        return pygame.Rect(int(tile['pos'][0]) - 1, int(tile['pos'][1]) - 1, picture.get_width() + 2,
+                           picture.get_height() + 2)
+
+    def visible_decor(self, view):
+        """Gives the offgrid tiles that can be seen in a rectangle in pixels, in the order they are in the map."""
+        if self.tile_map.streamed:  # only the chunks around the camera are in memory, so those are checked
+            return [tile for tile in self.tile_map.offgrid_in(view) if view.colliderect(self.decor_rect(tile))]
+        if self.decor is None:
+            self.decor = SpatialHash(DECOR_CELL_SIZE)
+            self.decor_rects = []
+            for number, tile in enumerate(self.tile_map.offgrid):
+                self.decor_rects.append(self.decor_rect(tile))
+                self.decor.insert(('decor', number), self.decor_rects[-1])
+        found = sorted(number for kind, number in self.decor.candidates(view)
+                       if view.colliderect(self.decor_rects[number]))
+        return [self.tile_map.offgrid[number] for number in found]
 
     def physics_rectangles(self, position):
-        """Sets the solid tiles."""
-        rectangles = []
-        for tile in self.surrounding_tiles(position):
-            if tile['type'] in PHYSICS_TILES:
-                rectangles.append(
-                    pygame.Rect(tile['pos'][0] * self.tile_dimension, tile['pos'][1] * self.tile_dimension,
-                                self.tile_dimension, self.tile_dimension)
-                )
-        return rectangles
+        """Sets the solid tiles. The returned list is reused by the next call."""
+        return self.solid_grid.solid_rects(position)
 
     def render(self, surface, offset=(0, 0)):
         """Puts the tiles on the background."""
-        for tile in self.exterior_tiles:
+        # only the decor the camera sees is blitted
+        for tile in self.visible_decor(pygame.Rect(offset, surface.get_size())):
             surface.blit(self.resources[tile['type']][tile['variant']],
                          (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-        for x in range(offset[0] // self.tile_dimension, (offset[0] + surface.get_width()) // self.tile_dimension + 1):
-            for y in range(offset[1] // self.tile_dimension,
-                           (offset[1] + surface.get_height()) // self.tile_dimension + 1):
-                location = str(x) + ';' + str(y)
-                if location in self.tile_layout:
-                    tile = self.tile_layout[location]
-                    surface.blit(self.resources[tile['type']][tile['variant']],
-                                 (tile['pos'][0] * self.tile_dimension - offset[0],
-                                  tile['pos'][1] * self.tile_dimension - offset[1]))
+        # the grid tiles are baked into chunks so only the chunks the camera sees get blitted
+        self.tile_chunks.draw(surface, offset)
 
     def run(self):
         """Runs the entire game. Renders all the resources on the visible screen."""
         play_game = True
+        self.last_step = None  # the time spent in the menu is not simulated
+        if pygame.display.get_surface().get_size() != self.window_size:  # the menu has a window of its own size
+            self.window = pygame.display.set_mode(self.window_size)
+            self.compositor = Compositor(self.window, self.scale)
         while play_game is True:
-            # background must be 320X240 
-            if self.currentMap == 'heaven.json':
-                self.render_surface.blit(self.resources['heaven-sunset'], (0, 0))
-            if self.currentMap == 'hell.json':
-                self.render_surface.blit(self.resources['hell'], (0, 0))
-            if self.currentMap == 'map.json':
-                self.render_surface.blit(self.resources['background'], (0, 0))
-            if self.currentMap == 'map2.json':
-                self.render_surface.blit(self.resources['forest-background'], (0, 0))
-
-            if self.avatar.avatar_velocity[1] > 2.5:
-                # Check if the sound is not already playing
-                if not self.channel3.get_busy():
-                    self.channel3.play(pygame.mixer.Sound('artifacts/artifacts_falling.mp3'))
-
-            if self.avatar.position[1] >= 250:
-                Adventure(self.currentMap).run()
-            self.scroll_offset[0] += (self.avatar.rect().centerx - self.render_surface.get_width() / 2 -
-                                      self.scroll_offset[0]) / 30
-            self.scroll_offset[1] += (self.avatar.rect().centery - self.render_surface.get_height() / 2 -
-                                      self.scroll_offset[1]) / 30
-            render_scroll = (int(self.scroll_offset[0]), int(self.scroll_offset[1]))
-            self.obstacle.drawObstacle(self.render_surface, distanceFromCamera=render_scroll)
-            if self.currentMap == 'heaven.json':
-                self.wisp.update_NPC()
-                self.wisp.render(self.render_surface, offset=render_scroll)
-            if self.currentMap == 'hell.json':
-                self.fluffy.update_NPC()
-                self.fluffy.render(self.render_surface, offset=render_scroll)
-            if self.currentMap == 'map.json':
-                self.tomato.update_NPC()
-                self.tomato.render(self.render_surface, offset=render_scroll)
-            if self.currentMap == 'map2.json':
-                self.chipmunk.update_NPC()
-                self.chipmunk.render(self.render_surface, offset=render_scroll)
-
-            self.render(self.render_surface, offset=render_scroll)
-            self.avatar.update_avatar(self.tile_layout, (self.movement_status[1] - self.movement_status[0], 0))
-            self.avatar.render(self.render_surface, offset=render_scroll)
-
-            self.artifacts.drawArtifacts(self.render_surface, distanceFromCamera=render_scroll)
-            
-            if self.wisp.check_collision_with_NPC(self.avatar.rect(), self.render_surface,
-                                                    distanceFromCamera=render_scroll) and self.currentMap == 'heaven.json':
-                self.message.drawMessage(self.render_surface, distanceFromCamera=render_scroll)
-                
-                if self.artifacts.canDogMoveOn and not self.currentMap == 'map.json': 
-                    Adventure('map.json').run()
-           
-            if self.currentMap == 'heaven.json' and self.avatar.position[1] >= 249:
-                Adventure('hell.json').run()
-
-            if self.fluffy.check_collision_with_NPC(self.avatar.rect(), self.render_surface,
-                                                    distanceFromCamera=render_scroll) and self.currentMap == 'hell.json':
-                self.message.drawMessage(self.render_surface, distanceFromCamera=render_scroll)
-                if self.artifacts.canDogMoveOn and not self.currentMap == 'map.json':
-                    Adventure('map.json').run()
-
-            if self.tomato.check_collision_with_NPC(self.avatar.rect(), self.render_surface,
-                                                    distanceFromCamera=render_scroll) and self.currentMap == 'map.json':
-                self.message.drawMessage(self.render_surface, distanceFromCamera=render_scroll)
-
-                if self.artifacts.canDogMoveOn and not self.currentMap == 'map2.json': 
-                    Adventure('map2.json').run() 
-            
-            if self.chipmunk.check_collision_with_NPC(self.avatar.rect(), self.render_surface,
-                                                    distanceFromCamera=render_scroll) and self.currentMap == 'map2.json':
-                self.message.drawMessage(self.render_surface, distanceFromCamera=render_scroll)
-
-            pygame.display.update()
-            self.artifacts.check_collision_with_artifacts(self.avatar.rect())
-            self.ghosts.draw_ghosts(self.render_surface, distanceFromCamera=render_scroll)
-            self.ghosts.check_collision_with_ghosts(self.avatar.rect())
-            if self.ghosts.check_collision_with_ghosts(self.avatar.rect()):
-                Adventure(self.currentMap).run()
-            if self.currentMap == 'map2.json' and self.avatar.position[0] >= 1004 and self.artifacts.canDogMoveOn:
-                self.display_congratulations(self.render_surface)
-                # self.channel1.pause()
-                # self.channel4.play(pygame.mixer.Sound('artifacts/fireworks.mp3'))
-                # self.channel1.unpause()
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_LEFT:
-                        self.movement_status[0] = True
-                    if event.key == pygame.K_RIGHT:
-                        self.movement_status[1] = True
-                    if event.key == pygame.K_UP:
-                        self.channel2.play(pygame.mixer.Sound('artifacts/jump-sound.mp3'))
-                        self.avatar.avatar_velocity[1] = -2
-                    # exit game back to main menu
-                    if event.key == pygame.K_ESCAPE:
-                        play_game = False
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_LEFT:
-                        self.movement_status[0] = False
-                    if event.key == pygame.K_RIGHT:
-                        self.movement_status[1] = False
-            self.window.blit(pygame.transform.scale(self.render_surface, self.window.get_size()), (0, 0))
-            pygame.display.update()
-
-            self.timer.tick(60)
+            play_game = self.step()
+            self.timer.tick(self.frame_rate)  # a frame_rate of 0 runs as fast as possible
         if not play_game:
-            self.channel1.pause() # stop the background music when esc is hit
-            Title().title_screen()
-
-
-Title().title_screen()
+            self.sounds.pause_music() # stop the background music when esc is hit
+
+    def step(self, elapsed=None):
+        """Runs one frame of the game: as many simulation ticks as the time since the last frame needs, then one
+        drawing. elapsed is the time in seconds to simulate, when it is not given the real time is used.
+        Returns False when the player wants to go back to the menu."""
+        self.profiler.begin()
+        now = time.perf_counter()
+        if elapsed is None:
+            elapsed = now - self.last_step if self.last_step is not None else self.tick_length
+        self.last_step = now
+        self.accumulator += elapsed
+
+        play_game = self.handle_events()
+        self.profiler.mark('events')
+
+        ticks = 0
+        while self.accumulator >= self.tick_length and ticks < MAX_TICKS_PER_FRAME:
+            self.tick()
+            self.accumulator -= self.tick_length
+            ticks += 1
+        if ticks == MAX_TICKS_PER_FRAME:
+            # too far behind to catch up, the rest of the time is dropped so the game does not spiral
+            self.accumulator %= self.tick_length
+
+        self.draw(self.accumulator / self.tick_length)
+        self.profiler.end()
+        return play_game
+
+    def handle_events(self):
+        """Reads the keys. Returns False when the player wants to go back to the menu."""
+        play_game = True
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_LEFT:
+                    self.movement_status[0] = True
+                if event.key == pygame.K_RIGHT:
+                    self.movement_status[1] = True
+                if event.key == pygame.K_UP:
+                    self.sounds.play_effect(self.channel2, JUMP_SOUND)
+                    self.avatar.avatar_velocity[1] = -2
+                # exit game back to main menu
+                if event.key == pygame.K_ESCAPE:
+                    play_game = False
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle_overlay()
+                if event.key == pygame.K_F4:
+                    self.profiler.toggle_csv(PROFILE_CSV)
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_LEFT:
+                    self.movement_status[0] = False
+                if event.key == pygame.K_RIGHT:
+                    self.movement_status[1] = False
+        return play_game
+
+    def tick(self):
+        """Moves the game forward by one simulation tick. Nothing is drawn here."""
+        if self.avatar.avatar_velocity[1] > 2.5:
+            # Check if the sound is not already playing
+            if not self.channel3.get_busy():
+                self.sounds.play_effect(self.channel3, FALL_SOUND)
+
+        if self.avatar.position[1] >= 250:
+            self.levels.respawn()
+        self.previous_scroll = list(self.scroll_offset)
+        self.scroll_offset[0] += (self.avatar.rect().centerx - self.render_surface.get_width() / 2 -
+                                  self.scroll_offset[0]) * self.camera_follow
+        self.scroll_offset[1] += (self.avatar.rect().centery - self.render_surface.get_height() / 2 -
+                                  self.scroll_offset[1]) * self.camera_follow
+        # a streamed map reads the chunks around the camera before they are drawn
+        self.tile_map.stream(pygame.Rect(int(self.scroll_offset[0]) - STREAM_MARGIN,
+                                         int(self.scroll_offset[1]) - STREAM_MARGIN,
+                                         self.render_surface.get_width() + 2 * STREAM_MARGIN,
+                                         self.render_surface.get_height() + 2 * STREAM_MARGIN))
+        self.profiler.mark('camera')
+        self.particles.update_particles()
+        self.profiler.mark('obstacles')
+        if self.currentMap == 'heaven.json':
+            self.wisp.update_NPC()
+        if self.currentMap == 'hell.json':
+            self.fluffy.update_NPC()
+        if self.currentMap == 'map.json':
+            self.tomato.update_NPC()
+        if self.currentMap == 'map2.json':
+            self.chipmunk.update_NPC()
+        self.profiler.mark('npc')
+
+        self.avatar.update_avatar(self.tile_map, (self.movement_status[1] - self.movement_status[0], 0))
+        self.profiler.mark('avatar')
+
+        self.talking = False  # the message box is drawn while the player touches the NPC
+        if self.currentMap == 'heaven.json' and self.wisp.check_collision_with_NPC(
+                self.avatar.rect(), self.render_surface):
+            self.talking = True
+
+            if self.artifacts.canDogMoveOn and not self.currentMap == 'map.json':
+                self.levels.change_level('map.json')
+
+        if self.currentMap == 'heaven.json' and self.avatar.position[1] >= 249:
+            self.levels.change_level('hell.json')
+
+        if self.currentMap == 'hell.json' and self.fluffy.check_collision_with_NPC(
+                self.avatar.rect(), self.render_surface):
+            self.talking = True
+            if self.artifacts.canDogMoveOn and not self.currentMap == 'map.json':
+                self.levels.change_level('map.json')
+
+        if self.currentMap == 'map.json' and self.tomato.check_collision_with_NPC(
+                self.avatar.rect(), self.render_surface):
+            self.talking = True
+
+            if self.artifacts.canDogMoveOn and not self.currentMap == 'map2.json':
+                self.levels.change_level('map2.json')
+
+        if self.currentMap == 'map2.json' and self.chipmunk.check_collision_with_NPC(
+                self.avatar.rect(), self.render_surface):
+            self.talking = True
+        self.profiler.mark('npc')
+
+        self.artifacts.check_collision_with_artifacts(self.avatar.rect())
+        self.profiler.mark('artifacts')
+        self.ghosts.update_ghosts()
+        if self.ghosts.check_collision_with_ghosts(self.avatar.rect()):
+            self.levels.respawn()
+        self.profiler.mark('ghosts')
+
+        # deaths and level changes asked for during the tick happen here
+        self.levels.apply()
+        self.profiler.mark('levels')
+
+    def draw(self, blend=1.0):
+        """Draws the game. blend is how far the time is between the last two ticks, the moving things are drawn
+        that far between where they were and where they are so the motion stays smooth at any frame rate."""
+        # background must be 320X240 
+        if self.currentMap == 'heaven.json':
+            self.render_surface.blit(self.resources['heaven-sunset'], (0, 0))
+        if self.currentMap == 'hell.json':
+            self.render_surface.blit(self.resources['hell'], (0, 0))
+        if self.currentMap == 'map.json':
+            self.render_surface.blit(self.resources['background'], (0, 0))
+        if self.currentMap == 'map2.json':
+            self.render_surface.blit(self.resources['forest-background'], (0, 0))
+        self.profiler.mark('background')
+
+        render_scroll = (int(self.previous_scroll[0] + (self.scroll_offset[0] - self.previous_scroll[0]) * blend),
+                         int(self.previous_scroll[1] + (self.scroll_offset[1] - self.previous_scroll[1]) * blend))
+        self.profiler.mark('camera')
+        self.particles.draw_particles(self.render_surface, distanceFromCamera=render_scroll, blend=blend)
+        self.profiler.mark('obstacles')
+        if self.currentMap == 'heaven.json':
+            self.wisp.render(self.render_surface, offset=render_scroll)
+        if self.currentMap == 'hell.json':
+            self.fluffy.render(self.render_surface, offset=render_scroll)
+        if self.currentMap == 'map.json':
+            self.tomato.render(self.render_surface, offset=render_scroll)
+        if self.currentMap == 'map2.json':
+            self.chipmunk.render(self.render_surface, offset=render_scroll)
+        self.profiler.mark('npc')
+
+        self.render(self.render_surface, offset=render_scroll)
+        self.profiler.mark('tiles')
+        self.avatar.render(self.render_surface, offset=render_scroll, blend=blend)
+        self.profiler.mark('avatar')
+
+        self.artifacts.drawArtifacts(self.render_surface, distanceFromCamera=render_scroll)
+        self.profiler.mark('artifacts')
+        if self.talking:
+            self.message.drawMessage(self.render_surface, distanceFromCamera=render_scroll)
+        self.profiler.mark('npc')
+        self.ghosts.draw_ghosts(self.render_surface, distanceFromCamera=render_scroll, blend=blend)
+        self.profiler.mark('ghosts')
+        banner = False
+        if self.currentMap == 'map2.json' and self.avatar.position[0] >= 1004 and self.artifacts.canDogMoveOn:
+            self.display_congratulations(self.render_surface)
+            banner = True
+            # self.sounds.pause_music()
+            # self.sounds.play_effect(self.channel4, 'artifacts/fireworks.mp3')
+            # pygame.mixer.music.unpause()
+        self.profiler.mark('banner')
+
+        self.profiler.draw(self.render_surface)
+        # the banner covers the whole frame, so once it is on the screen there is nothing new to show
+        if not (banner and self.banner_shown) or self.profiler.overlay:
+            self.compositor.compose(self.render_surface)
+        self.banner_shown = banner
+        self.compositor.present()
+        self.profiler.mark('present')
+
+
+if __name__ == '__main__':
+    Title().title_screen()
 
@@ -1,5 +1,14 @@
 import pygame
 import sys
+from everythingbutmain.Compositor import Compositor
+from everythingbutmain.TextCache import TEXT
+
+# the buttons of the menu: picture, where it goes, label and where the label goes
+BUTTONS = {
+    'start': ('start.png', (220, 305), 'Start', (285, 310)),
+    'exit': ('exit.png', (220, 370), 'Exit', (290, 375)),
+}
+HOVER_COLOR = 'gold'  # label color of the button under the mouse
 
 
 class Title:
@@ -8,36 +17,82 @@ class Title:
         pygame.init()
         pygame.display.set_caption('Main Menu')
         self.screen = pygame.display.set_mode((640, 480))
+        self.compositor = Compositor(self.screen)
+        self.game = None  # one game is kept for the whole session and restarted from the menu
+        self.menu = None  # the whole menu, drawn once
+        self.button_rects = {}
+        self.hover_patches = {}  # button -> (part of the menu it covers, that part with the button lit up)
+        self.hovered = None
 
-    def write(self, msg, size, color, coordinates):
-        # set message, and size
-        font = pygame.font.SysFont('Times New Roman', size, bold=True)
-        # render font and color
-        msgobj = font.render(msg, True, color)
+    def write(self, msg, size, color, coordinates, surface=None):
+        # render message in the size and color (the text cache keeps the font and the rendered text)
+        msgobj = TEXT.render(msg, 'Times New Roman', size, color, bold=True)
         # display message
-        self.screen.blit(msgobj, coordinates)
+        if surface is None:
+            surface = self.screen
+        return surface.blit(msgobj, coordinates)
 
-    def title_screen(self):
-        """title screen game loop"""
-        from MainGame import load_picture, Adventure # to avoid curricular import
-        while True:
-            # display background, start and exit buttons
-            self.screen.blit(load_picture("titleBackground.png"), (0, 0))
-            start_button = self.screen.blit(load_picture("start.png"), (220, 305))
-            exit_button = self.screen.blit(load_picture("exit.png"), (220, 370))
+    def compose_menu(self):
+        """Draws the background, buttons and text once, and the lit up version of every button."""
+        from MainGame import load_picture  # to avoid curricular import
+        self.menu = pygame.Surface(self.screen.get_size())
+        self.menu.blit(load_picture("titleBackground.png"), (0, 0))
+
+        # write title, start, and exit buttons
+        self.write('A Dog\'s Journey', 50, 'white', (140, 100), self.menu)
+        self.write('Home', 50, 'white', (260, 155), self.menu)
+        for name, (picture, position, label, label_position) in BUTTONS.items():
+            self.button_rects[name] = self.menu.blit(load_picture(picture), position)
+            self.write(label, 35, 'white', label_position, self.menu)
+
+        for name, (picture, position, label, label_position) in BUTTONS.items():
+            hovered = self.menu.copy()
+            label_rect = self.write(label, 35, HOVER_COLOR, label_position, hovered)
+            area = self.button_rects[name].union(label_rect)
+            self.hover_patches[name] = (area, hovered.subsurface(area).copy())
+
+    def show_menu(self):
+        """Puts the whole menu back on the screen."""
+        if self.menu is None:
+            self.compose_menu()
+        self.screen.blit(self.menu, (0, 0))
+        if self.hovered is not None:
+            area, patch = self.hover_patches[self.hovered]
+            self.screen.blit(patch, area)
+        self.compositor.mark_all()
 
-            # write title, start, and exit buttons
-            self.write('A Dog\'s Journey', 50, 'white', (140, 100))
-            self.write('Home', 50, 'white', (260, 155))
-            self.write('Start', 35, 'white', (285, 310))
-            self.write('Exit', 35, 'white', (290, 375))
+    def button_at(self, position):
+        """Finds the button under a point of the window."""
+        for name, rect in self.button_rects.items():
+            if rect.collidepoint(position):
+                return name
+        return None
 
-            # get mouse position
-            a, b = pygame.mouse.get_pos()
+    def set_hover(self, hovered):
+        """Lights up the button under the mouse and only redraws the buttons that changed."""
+        if hovered == self.hovered:
+            return
+        if self.hovered is not None:
+            area = self.hover_patches[self.hovered][0]
+            self.screen.blit(self.menu, area, area)
+            self.compositor.mark_dirty(area)
+        if hovered is not None:
+            area, patch = self.hover_patches[hovered]
+            self.screen.blit(patch, area)
+            self.compositor.mark_dirty(area)
+        self.hovered = hovered
 
-            button_pressed = False
-            # event handler for button clicks
-            for event in pygame.event.get():
+    def title_screen(self):
+        """title screen game loop. It sleeps until there is an event, so an idle menu uses no CPU."""
+        from MainGame import Adventure  # to avoid curricular import
+        self.show_menu()
+        self.set_hover(self.button_at(pygame.mouse.get_pos()))
+        self.compositor.present()
+        while True:
+            clicked = None
+            hovered = self.hovered
+            # event handler for button clicks, waits for the next event and then takes all the waiting ones
+            for event in [pygame.event.wait()] + pygame.event.get():
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
@@ -45,20 +100,32 @@ class Title:
                     if event.key == pygame.K_ESCAPE:
                         pygame.quit()
                         sys.exit()
-
+                if event.type == pygame.MOUSEMOTION:
+                    hovered = self.button_at(event.pos)
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:
-                        button_pressed = True
+                        clicked = self.button_at(event.pos)
+                if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    self.show_menu()  # the window was covered up
+            self.set_hover(hovered)
 
-            # check for collisions with buttons
-            if start_button.collidepoint(a, b):
-                if button_pressed:
-                    Adventure().run()
-
-            if exit_button.collidepoint(a, b):
-                if button_pressed:
-                    pygame.quit()
-                    sys.exit()
+            # check for clicks on the buttons
+            if clicked == 'start':
+                if self.game is None:
+                    self.game = Adventure()
+                else:
+                    self.game.load_level(self.game.starting_map)
+                self.game.run()
+                pygame.display.set_caption('Main Menu')
+                if pygame.display.get_surface().get_size() != self.screen.get_size():
+                    self.screen = pygame.display.set_mode(self.menu.get_size())
+                    self.compositor = Compositor(self.screen)
+                self.set_hover(self.button_at(pygame.mouse.get_pos()))
+                self.show_menu()  # the game drew over the whole window
 
-            pygame.display.update()
+            if clicked == 'exit':
+                pygame.quit()
+                sys.exit()
 
+            # only the parts of the menu that changed are sent to the display
+            self.compositor.present()
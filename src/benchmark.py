@@ -0,0 +1,190 @@
+"""
+This file runs the game without a window to measure how fast it is.
+It uses SDL's dummy video and audio drivers, so nothing is shown or played, and it does not wait between frames. For
+every map it replays the same scripted key presses (so every run plays the same game) and reports how long the frames
+took, how many frames were run per second and how much memory was used. After the frames of a map it also checks that
+changing a tile with Adventure.set_tile reaches the map, its baked chunk, the solid flags and the free spots (and, for
+a streamed .djworld map, that the changed chunk is kept in memory).
+Run it from the top folder of the project:  python src/benchmark.py
+"""
+
+import os
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+import pygame
+from MainGame import Adventure, PHYSICS_TILES
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+MAPS = ['heaven.json', 'hell.json', 'map.json', 'map2.json']
+KEYS = {'left': pygame.K_LEFT, 'right': pygame.K_RIGHT, 'up': pygame.K_UP}
+
+
+def patrol_trace(frames, turn_every, jump_every):
+    """Makes a key script that runs one way, jumps now and then and turns around every turn_every frames."""
+    trace = []
+    direction = 'right'
+    trace.append((0, direction, True))
+    for frame in range(1, frames):
+        if frame % turn_every == 0:
+            trace.append((frame, direction, False))
+            direction = 'left' if direction == 'right' else 'right'
+            trace.append((frame, direction, True))
+        if frame % jump_every == 0:
+            trace.append((frame, 'up', True))
+            trace.append((frame + 1, 'up', False))
+    return trace
+
+
+# (frame, key, pressed) scripts for each map
+TRACES = {
+    'heaven.json': lambda frames: patrol_trace(frames, 90, 45),  # turning later walks off the level into hell
+    'hell.json': lambda frames: patrol_trace(frames, 180, 60),
+    'map.json': lambda frames: patrol_trace(frames, 200, 50),
+    'map2.json': lambda frames: patrol_trace(frames, 300, 40),
+}
+
+
+def percentile(times, percent):
+    """Gives the value below which the given percent of the sorted times fall."""
+    index = min(len(times) - 1, int(round(percent / 100 * (len(times) - 1))))
+    return times[index]
+
+
+def play(game, currentMap, frames, warmup, seed):
+    """Plays the scripted keys on one map and times every frame. Returns the times and how many times the player
+    respawned, since a respawn reloads the level in the middle of the run."""
+    random.seed(seed)
+    game.load_level(currentMap)
+    trace = {}
+    for frame, key, pressed in TRACES[currentMap](warmup + frames):
+        trace.setdefault(frame, []).append((key, pressed))
+
+    times = []
+    respawns = game.levels.respawns
+    for frame in range(warmup + frames):
+        for key, pressed in trace.get(frame, []):
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN if pressed else pygame.KEYUP, key=KEYS[key]))
+        start = time.perf_counter()
+        game.step(game.tick_length)  # one simulation tick per frame so every run plays the same
+        if frame >= warmup:
+            times.append(time.perf_counter() - start)
+        if game.currentMap != currentMap:  # the frames after this would be timed on another level
+            raise RuntimeError('the %s trace left the level at frame %d (now on %s), shorten it or change its keys'
+                               % (currentMap, frame, game.currentMap))
+    return times, game.levels.respawns - respawns
+
+
+def check_tile_edit(game):
+    """Takes away the first solid tile of the map with set_tile and puts it back, checking that the map, its baked
+    chunk, the solid flags and the free spots for the bones follow the change. Runs after the timed frames so it does
+    not change them."""
+    for x, y, type_name, variant in game.tile_map.tiles():
+        if type_name in PHYSICS_TILES:
+            break
+    else:
+        return
+    chunk = game.tile_chunks.chunk_of(x, y)
+    free_space = game.spawn_index()
+    game.set_tile(x, y, None)
+    if game.tile_map.get(x, y) is not None or game.solid_grid.is_solid(x, y) or chunk not in game.tile_chunks.dirty:
+        raise RuntimeError('removing the tile at (%d, %d) of %s did not reach the map' % (x, y, game.currentMap))
+    if game.spawn_index() is free_space:
+        raise RuntimeError('the free spots of %s were not found again after a tile changed' % game.currentMap)
+    if game.tile_map.streamed:  # a changed chunk of a .djworld map has to stay in memory, the file has the old one
+        max_chunks = game.tile_map.max_chunks
+        game.tile_map.max_chunks = 0
+        game.tile_map.evict()
+        game.tile_map.max_chunks = max_chunks
+        if game.tile_map.get(x, y) is not None:
+            raise RuntimeError('the changed chunk of %s was dropped and read from the file again' % game.currentMap)
+    game.draw()  # bakes the chunk again
+    game.set_tile(x, y, {'type': type_name, 'variant': variant})
+    if game.tile_map.get(x, y) != (type_name, variant) or not game.solid_grid.is_solid(x, y):
+        raise RuntimeError('putting back the tile at (%d, %d) of %s did not reach the map' % (x, y, game.currentMap))
+    game.draw()
+
+
+def peak_rss_kb():
+    """Gives the most memory the whole process has used so far, if the system can tell."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kilobytes on Linux
+
+
+def report(currentMap, times, respawns, peak_bytes):
+    """Turns the frame times of one map into the numbers that get printed."""
+    total = sum(times)
+    times = sorted(times)
+    return {
+        'map': currentMap,
+        'frames': len(times),
+        'respawns': respawns,
+        'ticks_per_second': len(times) / total,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p90_ms': percentile(times, 90) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'max_ms': times[-1] * 1000,
+        'peak_memory_kb': peak_bytes / 1024 if peak_bytes is not None else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the game loop without a window and times it.')
+    parser.add_argument('--frames', type=int, default=1200, help='frames timed on each map')
+    parser.add_argument('--warmup', type=int, default=60, help='frames played before timing starts')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random bone placement')
+    parser.add_argument('--maps', nargs='+', default=MAPS, choices=MAPS)
+    parser.add_argument('--memory', action='store_true',
+                        help='also track peak memory (slows the frames down, so the times are not comparable)')
+    parser.add_argument('--json', help='file to write the results to')
+    parser.add_argument('--profile', help='csv file to write the time of every frame stage to')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    game = Adventure(args.maps[0], frame_rate=0)
+    startup = time.perf_counter() - start
+    if args.profile:
+        game.profiler.start_csv(args.profile)
+
+    results = []
+    for currentMap in args.maps:
+        peak = None
+        if args.memory:
+            tracemalloc.start()
+        times, respawns = play(game, currentMap, args.frames, args.warmup, args.seed)
+        if args.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        check_tile_edit(game)
+        results.append(report(currentMap, times, respawns, peak))
+
+    print('startup: %.1f ms' % (startup * 1000))
+    print('%-12s %8s %9s %9s %9s %9s %9s %12s %12s' % ('map', 'ticks/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms',
+                                                         'respawns', 'peak kb', 'rss kb'))
+    for result in results:
+        peak = '%.0f' % result['peak_memory_kb'] if result['peak_memory_kb'] is not None else '-'
+        rss = '%d' % result['peak_rss_kb'] if result['peak_rss_kb'] is not None else '-'
+        print('%-12s %8.0f %9.3f %9.3f %9.3f %9.3f %9d %12s %12s' % (result['map'], result['ticks_per_second'],
+                                                                      result['p50_ms'], result['p90_ms'],
+                                                                      result['p99_ms'], result['max_ms'],
+                                                                      result['respawns'], peak, rss))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'startup_ms': startup * 1000, 'results': results}, f, indent=2)
+    game.profiler.stop_csv()
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
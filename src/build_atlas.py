@@ -0,0 +1,28 @@
+"""
+This file packs the sprite and tile pictures into the texture atlas (see everythingbutmain/Atlas.py).
+The game uses a picture from the atlas only when the picture has not changed since the atlas was built, so run this
+again after editing or adding pictures. Run it from the top folder of the project:  python src/build_atlas.py
+"""
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # a display mode is needed to convert the pictures, not a window
+
+import pygame
+from everythingbutmain.Atlas import ATLAS_DIR, build_atlas
+from loadingpics import BASE_IMAGE_DIR
+
+
+def main():
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    manifest = build_atlas(BASE_IMAGE_DIR)
+    for name in manifest['sheets']:
+        size = pygame.image.load(os.path.join(ATLAS_DIR, name)).get_size()
+        print('%s%s: %dx%d' % (ATLAS_DIR, name, size[0], size[1]))
+    print('%d pictures packed into %d sheets' % (len(manifest['pictures']), len(manifest['sheets'])))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+This file turns the .json maps into compiled .djmap maps that load much faster.
+The game uses a compiled map automatically when it is newer than its .json map, so run this again after editing a map.
+With --chunked the maps are compiled into .djworld files instead, which the game streams a chunk at a time (for maps
+too big to keep in memory, see everythingbutmain/ChunkedMap.py).
+Run it from the top folder of the project:  python src/compile_maps.py            (compiles every map in src)
+                                            python src/compile_maps.py src/map.json
+                                            python src/compile_maps.py --chunked src/map.json
+"""
+
+import argparse
+import glob
+import os
+from everythingbutmain.MapFormat import compile_map
+from everythingbutmain.ChunkedMap import compile_world
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compiles the .json maps.')
+    parser.add_argument('paths', nargs='*', help='maps to compile (every map in src when none are given)')
+    parser.add_argument('--chunked', action='store_true', help='write streamed .djworld files')
+    args = parser.parse_args(argv)
+    paths = args.paths
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.json')))
+    for path in paths:
+        compiled = compile_world(path) if args.chunked else compile_map(path)
+        print('%s -> %s (%d bytes, was %d)' % (path, compiled, os.path.getsize(compiled), os.path.getsize(path)))
+
+
+if __name__ == '__main__':
+    main()
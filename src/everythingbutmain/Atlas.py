@@ -0,0 +1,95 @@
+"""
+This file holds the code for the texture atlas.
+build_atlas packs the small pictures of the sprite and tile folders into a few big sheets and writes a manifest that
+says where each picture is on which sheet. When the atlas is there the game loads the sheets once and every frame or
+tile variant becomes a subsurface of a sheet, so far fewer files are opened when a level starts and the pictures that
+are drawn together are close together in memory.
+The pictures are copied onto the sheets after convert(), the same way load_picture loads them, so they look exactly
+the same. A picture is only taken from the atlas when its file has not changed since the atlas was built, otherwise the
+file is loaded like before.
+
+Layout of the manifest (json):
+    sheets: the file names of the sheets
+    pictures: path of the picture -> [sheet number, x, y, width, height, modification time of the file]
+"""
+
+import json
+import os
+import pygame
+
+ATLAS_DIR = 'artifacts/atlas/'
+MANIFEST = 'manifest.json'
+ATLAS_FOLDERS = ['tiles', 'entities', 'float', 'artifacts']  # searched for pictures, sub folders included
+SHEET_SIZE = 1024  # width and height of a sheet in pixels (a bigger picture gets a sheet of its own size)
+
+
+def pack(sizes, sheet_size=SHEET_SIZE):
+    """Puts rectangles on sheets in rows (tallest first). Returns (sheet number, x, y) for each size and the size
+    every sheet needs."""
+    order = sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0]))
+    places = [None] * len(sizes)
+    sheets = []  # [width used, height used]
+    x = y = row_height = 0
+    for index in order:
+        width, height = sizes[index]
+        if not sheets:
+            sheets.append([0, 0])
+        if x + width > max(sheet_size, width):  # start a new row
+            x = 0
+            y += row_height
+            row_height = 0
+        if y + height > max(sheet_size, height) and y > 0:  # start a new sheet
+            sheets.append([0, 0])
+            x = y = row_height = 0
+        places[index] = (len(sheets) - 1, x, y)
+        sheets[-1][0] = max(sheets[-1][0], x + width)
+        sheets[-1][1] = max(sheets[-1][1], y + height)
+        x += width
+        row_height = max(row_height, height)
+    return places, sheets
+
+
+def find_pictures(base_dir, folders=ATLAS_FOLDERS):
+    """Gives the paths (relative to base_dir) of every picture in the folders."""
+    paths = []
+    for folder in folders:
+        for root, dirs, files in os.walk(os.path.join(base_dir, folder)):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith('.png') or name.endswith('.jpg'):
+                    paths.append(os.path.relpath(os.path.join(root, name), base_dir).replace(os.sep, '/'))
+    return paths
+
+
+def build_atlas(base_dir, atlas_dir=ATLAS_DIR, folders=ATLAS_FOLDERS, sheet_size=SHEET_SIZE):
+    """Packs the pictures of the folders into sheets and writes them with the manifest. Needs a display mode to be set
+    so the pictures can be converted like the game does."""
+    paths = find_pictures(base_dir, folders)
+    pictures = [pygame.image.load(os.path.join(base_dir, path)).convert() for path in paths]
+    places, sizes = pack([picture.get_size() for picture in pictures], sheet_size)
+
+    sheets = [pygame.Surface(size).convert() for size in sizes]
+    for picture, (sheet, x, y) in zip(pictures, places):
+        sheets[sheet].blit(picture, (x, y))
+
+    os.makedirs(atlas_dir, exist_ok=True)
+    names = []
+    for number, sheet in enumerate(sheets):
+        names.append('sheet%d.png' % number)
+        pygame.image.save(sheet, os.path.join(atlas_dir, names[-1]))
+    manifest = {'sheets': names, 'pictures': {}}
+    for path, picture, (sheet, x, y) in zip(paths, pictures, places):
+        manifest['pictures'][path] = [sheet, x, y, picture.get_width(), picture.get_height(),
+                                      os.path.getmtime(os.path.join(base_dir, path))]
+    with open(os.path.join(atlas_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def load_manifest(atlas_dir=ATLAS_DIR):
+    """Reads the manifest of the atlas, or gives None when the atlas has not been built."""
+    path = os.path.join(atlas_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
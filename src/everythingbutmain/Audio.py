@@ -0,0 +1,49 @@
+"""
+This file holds the code for the sounds and the music.
+The SoundBank class decodes the short sound effects (jumping and falling) once and keeps them, so pressing a key does
+not decode an mp3 in the middle of a frame. The background music is long, so instead of being decoded into memory it is
+streamed from the file a little at a time by pygame's music player.
+"""
+
+import io
+import os
+import pygame
+
+JUMP_SOUND = 'artifacts/jump-sound.mp3'
+FALL_SOUND = 'artifacts/artifacts_falling.mp3'
+MUSIC_VOLUME = 0.4  # 40% of maximum (0.2 is 20%)
+
+
+class SoundBank:
+    def __init__(self, effects=(JUMP_SOUND, FALL_SOUND)):
+        """Decodes the sound effects up front and sets up the music player."""
+        self.effects = {}
+        for path in effects:
+            self.effect(path)
+        pygame.mixer.music.set_volume(MUSIC_VOLUME)
+        self.music = None
+        self.music_file = None
+
+    def effect(self, path):
+        """Gives the decoded sound for a path, decoding it the first time it is asked for."""
+        if path not in self.effects:
+            self.effects[path] = pygame.mixer.Sound(path)
+        return self.effects[path]
+
+    def play_effect(self, channel, path):
+        """Plays a sound effect on the given channel."""
+        channel.play(self.effect(path))
+
+    def play_music(self, path, loops=0, data=None):
+        """Streams a music track from its file, or from the bytes of the file when they were read ahead of time."""
+        if data is not None:
+            self.music_file = io.BytesIO(data)  # kept here because the player reads from it while it plays
+            pygame.mixer.music.load(self.music_file, os.path.splitext(path)[1][1:])
+        else:
+            pygame.mixer.music.load(path)
+        pygame.mixer.music.play(loops=loops)
+        self.music = path
+
+    def pause_music(self):
+        """Pauses the music that is playing."""
+        pygame.mixer.music.pause()
@@ -0,0 +1,63 @@
+"""
+This file holds the code for finding which things are near the player.
+The SpatialHash class splits the world into square cells and remembers which cells every collidable thing (bones,
+enemies and NPCs) covers. Things tell it when they move, and it only updates the cells that changed. When the player
+checks for collisions it only gets back the things in the cells around the player, so the exact rectangle checks are
+only done for a few things no matter how many there are on the map.
+"""
+
+CELL_SIZE = 64  # pixels
+
+
+class SpatialHash:
+    def __init__(self, cell_size=CELL_SIZE):
+        """An empty grid of cells."""
+        self.cell_size = cell_size
+        self.cells = {}  # (cell x, cell y) -> set of keys
+        self.entries = {}  # key -> (first cell x, first cell y, last cell x, last cell y)
+
+    def cell_range(self, rect):
+        """Gives the first and last cells a rectangle covers."""
+        return (int(rect[0] // self.cell_size), int(rect[1] // self.cell_size),
+                int((rect[0] + max(rect[2], 1) - 1) // self.cell_size),
+                int((rect[1] + max(rect[3], 1) - 1) // self.cell_size))
+
+    def insert(self, key, rect):
+        """Adds a thing to the cells its rectangle covers. The first part of the key is its kind, e.g. ('ghost', 2)."""
+        bounds = self.cell_range(rect)
+        self.entries[key] = bounds
+        for x in range(bounds[0], bounds[2] + 1):
+            for y in range(bounds[1], bounds[3] + 1):
+                self.cells.setdefault((x, y), set()).add(key)
+
+    def remove(self, key):
+        """Takes a thing out of the grid."""
+        bounds = self.entries.pop(key, None)
+        if bounds is None:
+            return
+        for x in range(bounds[0], bounds[2] + 1):
+            for y in range(bounds[1], bounds[3] + 1):
+                bucket = self.cells[(x, y)]
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[(x, y)]
+
+    def move(self, key, rect):
+        """Updates a thing that moved. Nothing happens if it is still in the same cells."""
+        if self.entries.get(key) == self.cell_range(rect):
+            return
+        self.remove(key)
+        self.insert(key, rect)
+
+    def candidates(self, rect, kind=None):
+        """Gives the keys of the things (of one kind, if given) in the cells a rectangle covers."""
+        bounds = self.cell_range(rect)
+        found = set()
+        for x in range(bounds[0], bounds[2] + 1):
+            for y in range(bounds[1], bounds[3] + 1):
+                bucket = self.cells.get((x, y))
+                if bucket:
+                    found.update(bucket)
+        if kind is not None:
+            return [key for key in found if key[0] == kind]
+        return list(found)
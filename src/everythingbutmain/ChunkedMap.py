@@ -0,0 +1,267 @@
+"""
+This file holds the code for maps that are too big to keep in memory.
+The ChunkedMap class reads a .djworld file, where the map is cut into square chunks of CHUNK_TILES x CHUNK_TILES tiles
+that are stored one after the other, with a table that says where each chunk starts. Only the header and the table are
+read when the level is loaded. A chunk is read the first time something asks for one of its tiles (drawing, collisions
+or placing the bones), and when more than max_chunks chunks are in memory the one that was used the longest time ago is
+dropped. So the memory a level uses depends on how much of the map is around the camera, not on how big the map is.
+Chunks with tiles that were changed are kept until the level is left.
+Every chunk is a small TileMap, so it can be asked for its tiles the same way as a whole map.
+compile_world turns a .json map into a .djworld file.
+
+Layout of a .djworld file (little endian):
+    header: magic, version, tile size, chunk size in tiles, first chunk x, first chunk y, chunks across, chunks down,
+            number of types
+    type names: one length byte and the utf-8 name for each type
+    chunk table: offset and length of every chunk, row by row (length 0 for a chunk without anything in it)
+    chunks: types and variants (chunk size * chunk size bytes each), number of offgrid tiles and the offgrid tiles,
+            each followed by its place in the offgrid list of the .json map (so decor is drawn in the same order)
+"""
+
+import json
+import struct
+from collections import OrderedDict
+from everythingbutmain.MapFormat import TileMap, OFFGRID, EMPTY, world_path
+
+MAGIC = b'DJWD'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHiiIIH')
+ENTRY = struct.Struct('<QI')
+COUNT = struct.Struct('<I')
+ORDER = struct.Struct('<I')
+WORLD_OFFGRID = struct.Struct('<' + OFFGRID.format[1:] + ORDER.format[1:])
+CHUNK_TILES = 16  # same as the baked tile chunks, so one map chunk is one baked surface
+MAX_CHUNKS = 64  # chunks kept in memory at most (the changed ones do not count)
+
+
+class ChunkedMap:
+    streamed = True  # the rest of the game asks for the parts of the map it needs instead of going through all of it
+
+    def __init__(self, path, max_chunks=MAX_CHUNKS):
+        """Reads the header and the chunk table of a .djworld file."""
+        self.path = path
+        self.max_chunks = max_chunks
+        with open(path, 'rb') as f:
+            magic, version, self.tile_size, self.chunk_tiles, first_x, first_y, across, down, type_count = \
+                HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(path + ' is not a world this version of the game can read')
+            self.type_names = []
+            for _ in range(type_count):
+                length = f.read(1)[0]
+                self.type_names.append(f.read(length).decode('utf-8'))
+            table = f.read(ENTRY.size * across * down)
+        self.type_ids = {name: index + 1 for index, name in enumerate(self.type_names)}
+        self.chunk_pixels = self.tile_size * self.chunk_tiles
+
+        self.table = {}  # (chunk x, chunk y) -> (offset, length) in the file
+        for number, (offset, length) in enumerate(ENTRY.iter_unpack(table)):
+            if length:
+                self.table[(first_x + number % across, first_y + number // across)] = (offset, length)
+        self.chunks = OrderedDict()  # the chunks in memory, least recently used first
+        self.changed = set()  # chunks with changed tiles, they are never dropped
+        self.loads = 0
+        self.evictions = 0
+
+    def intern(self, type_name):
+        """Gives the number stored in the grid for a tile type, adding the type if it is new."""
+        if type_name not in self.type_ids:
+            self.type_names.append(type_name)
+            self.type_ids[type_name] = len(self.type_names)
+        return self.type_ids[type_name]
+
+    def chunk(self, chunk_x, chunk_y, create=False):
+        """Gives a chunk, reading it from the file if it is not in memory. Gives None for a chunk with nothing in it,
+        unless create is True."""
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        if key not in self.table and not create:
+            return None
+        chunk = self.read_chunk(key)
+        self.chunks[key] = chunk
+        self.evict()
+        return chunk
+
+    def read_chunk(self, key):
+        """Reads one chunk from the file (or makes an empty one when it is not in the file)."""
+        cells = self.chunk_tiles * self.chunk_tiles
+        origin_x, origin_y = key[0] * self.chunk_tiles, key[1] * self.chunk_tiles
+        if key not in self.table:
+            chunk = TileMap(self.tile_size, origin_x, origin_y, self.chunk_tiles, self.chunk_tiles, self.type_names)
+            chunk.order = []
+            return chunk
+        offset, length = self.table[key]
+        data = bytearray(length)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            f.readinto(data)
+        self.loads += 1
+        view = memoryview(data)
+        count = COUNT.unpack_from(data, 2 * cells)[0]
+        at = 2 * cells + COUNT.size
+        offgrid = []
+        order = []
+        for type_id, variant, x, y, place in WORLD_OFFGRID.iter_unpack(view[at:at + count * WORLD_OFFGRID.size]):
+            offgrid.append({'type': self.type_names[type_id - 1], 'variant': variant, 'pos': [x, y]})
+            order.append(place)
+        chunk = TileMap(self.tile_size, origin_x, origin_y, self.chunk_tiles, self.chunk_tiles, self.type_names,
+                        view[:cells], view[cells:2 * cells], offgrid)
+        chunk.order = order
+        return chunk
+
+    def evict(self):
+        """Drops the least recently used chunks that were not changed until max_chunks are left."""
+        if len(self.chunks) <= self.max_chunks:
+            return
+        for key in list(self.chunks):
+            if len(self.chunks) <= self.max_chunks:
+                break
+            if key not in self.changed:
+                del self.chunks[key]
+                self.evictions += 1
+
+    def chunk_range(self, rect):
+        """Gives the chunks that a rectangle in pixels covers."""
+        return (rect[0] // self.chunk_pixels, rect[1] // self.chunk_pixels,
+                (rect[0] + rect[2]) // self.chunk_pixels, (rect[1] + rect[3]) // self.chunk_pixels)
+
+    def stream(self, rect):
+        """Reads the chunks a rectangle in pixels covers, so they are ready before the camera gets there."""
+        first_x, first_y, last_x, last_y = self.chunk_range(rect)
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                self.chunk(chunk_x, chunk_y)
+
+    def type_at(self, x, y):
+        """Gives the type number of the tile at a grid position (EMPTY when there is none)."""
+        chunk = self.chunk(x // self.chunk_tiles, y // self.chunk_tiles)
+        if chunk is None:
+            return EMPTY
+        return chunk.types[(y - chunk.origin_y) * self.chunk_tiles + x - chunk.origin_x]
+
+    def get(self, x, y):
+        """Gives (type, variant) of the tile at a grid position, or None if there is no tile."""
+        chunk = self.chunk(x // self.chunk_tiles, y // self.chunk_tiles)
+        if chunk is None:
+            return None
+        return chunk.get(x, y)
+
+    def set(self, x, y, type_name, variant=0):
+        """Puts a tile at a grid position (or removes it when type_name is None)."""
+        key = (x // self.chunk_tiles, y // self.chunk_tiles)
+        chunk = self.chunk(key[0], key[1], create=True)
+        if isinstance(chunk.types, memoryview):  # read from the file, copied before it is changed
+            chunk.types, chunk.variants = bytearray(chunk.types), bytearray(chunk.variants)
+        index = chunk.index(x, y)
+        chunk.types[index] = EMPTY if type_name is None else self.intern(type_name)
+        chunk.variants[index] = 0 if type_name is None else variant
+        self.changed.add(key)
+
+    def offgrid_in(self, rect):
+        """Gives the offgrid tiles of the chunks around a rectangle in pixels. The chunks to the left and above are
+        included too, because big decor can reach into the rectangle from there. They come in the order of the .json
+        map, so overlapping decor is drawn the same way as when the whole map is loaded."""
+        first_x, first_y, last_x, last_y = self.chunk_range(rect)
+        offgrid = []
+        for chunk_y in range(first_y - 1, last_y + 1):
+            for chunk_x in range(first_x - 1, last_x + 1):
+                chunk = self.chunk(chunk_x, chunk_y)
+                if chunk is not None:
+                    offgrid.extend(zip(chunk.order, chunk.offgrid))
+        offgrid.sort(key=lambda placed: placed[0])
+        return [tile for place, tile in offgrid]
+
+    def all_chunks(self):
+        """Goes through every chunk of the map, reading them one by one."""
+        for key in sorted(set(self.table) | self.changed):
+            yield self.chunk(key[0], key[1], create=True)
+
+    def tiles(self):
+        """Goes through every grid tile as (x, y, type, variant). This reads the whole map."""
+        for chunk in self.all_chunks():
+            yield from chunk.tiles()
+
+    @property
+    def offgrid(self):
+        """Every offgrid tile of the map. This reads the whole map."""
+        offgrid = [placed for chunk in self.all_chunks() for placed in zip(chunk.order, chunk.offgrid)]
+        offgrid.sort(key=lambda placed: placed[0])
+        return [tile for place, tile in offgrid]
+
+    def to_json(self):
+        """Turns the map back into the dictionary used by the .json maps. This reads the whole map."""
+        tilemap = {}
+        for x, y, type_name, variant in self.tiles():
+            tilemap[str(x) + ';' + str(y)] = {'type': type_name, 'variant': variant, 'pos': [x, y]}
+        return {'tilemap': tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid}
+
+    def resident_bytes(self):
+        """Gives roughly how much memory the chunks in memory take."""
+        return sum(len(chunk.types) + len(chunk.variants) + len(chunk.offgrid) * WORLD_OFFGRID.size
+                   for chunk in self.chunks.values())
+
+
+def save_world(tile_map, path, chunk_tiles=CHUNK_TILES):
+    """Writes a map as a .djworld file cut into chunks."""
+    chunk_pixels = tile_map.tile_size * chunk_tiles
+    tiles = {}
+    offgrid = {}
+    for x, y, type_name, variant in tile_map.tiles():
+        tiles.setdefault((x // chunk_tiles, y // chunk_tiles), []).append((x, y, type_name, variant))
+    for place, tile in enumerate(tile_map.offgrid):
+        key = (int(tile['pos'][0] // chunk_pixels), int(tile['pos'][1] // chunk_pixels))
+        offgrid.setdefault(key, []).append((place, tile))
+    keys = set(tiles) | set(offgrid)
+    if keys:
+        first_x, first_y = min(key[0] for key in keys), min(key[1] for key in keys)
+        across = max(key[0] for key in keys) - first_x + 1
+        down = max(key[1] for key in keys) - first_y + 1
+    else:
+        first_x = first_y = across = down = 0
+
+    type_names = []
+    type_ids = {}
+    for type_name in [tile[2] for chunk in tiles.values() for tile in chunk] + [tile['type'] for tile in tile_map.offgrid]:
+        if type_name not in type_ids:
+            type_names.append(type_name)
+            type_ids[type_name] = len(type_names)
+
+    cells = chunk_tiles * chunk_tiles
+    chunks = []
+    for number in range(across * down):
+        key = (first_x + number % across, first_y + number // across)
+        if key not in keys:
+            chunks.append(b'')
+            continue
+        types = bytearray(cells)
+        variants = bytearray(cells)
+        for x, y, type_name, variant in tiles.get(key, []):
+            index = (y - key[1] * chunk_tiles) * chunk_tiles + x - key[0] * chunk_tiles
+            types[index] = type_ids[type_name]
+            variants[index] = variant
+        chunk_offgrid = offgrid.get(key, [])
+        chunks.append(bytes(types) + bytes(variants) + COUNT.pack(len(chunk_offgrid)) +
+                      b''.join(WORLD_OFFGRID.pack(type_ids[tile['type']], tile['variant'], tile['pos'][0], tile['pos'][1],
+                                                  place) for place, tile in chunk_offgrid))
+
+    names = b''.join(struct.pack('<B', len(name.encode('utf-8'))) + name.encode('utf-8') for name in type_names)
+    header = HEADER.pack(MAGIC, VERSION, tile_map.tile_size, chunk_tiles, first_x, first_y, across, down,
+                         len(type_names))
+    offset = len(header) + len(names) + ENTRY.size * len(chunks)
+    table = b''
+    for chunk in chunks:
+        table += ENTRY.pack(offset if chunk else 0, len(chunk))
+        offset += len(chunk)
+    with open(path, 'wb') as f:
+        f.write(header + names + table + b''.join(chunks))
+
+
+def compile_world(path):
+    """Turns a .json map into a .djworld file next to it."""
+    with open(path, 'r') as f:
+        tile_map = TileMap.from_json(json.load(f))
+    save_world(tile_map, world_path(path))
+    return world_path(path)
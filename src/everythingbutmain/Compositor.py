@@ -0,0 +1,76 @@
+"""
+This file holds the code that shows each finished frame on the display.
+The Compositor class is the only place that pushes pictures to the display and it does it once per frame. A screen
+either asks for the whole frame to be shown, or only marks the rectangles that changed, so a screen that stays the same
+(like the menu or the congratulations banner) only sends the parts that changed, or nothing at all.
+The game picture is scaled up by a whole number (the biggest one that fits the window, unless a scale is given) straight
+into the part of the window it is shown in, so no new surface is made every frame. When the window is not a whole
+number of times the game picture the rest of the window is filled black.
+"""
+
+import pygame
+
+
+class Compositor:
+    def __init__(self, window, scale=None):
+        """Keeps track of what has to be sent to the display at the end of the frame."""
+        self.window = window
+        self.full = True  # the first frame always has to be shown completely
+        self.dirty = []
+        self.presents = 0  # how many times something was actually sent to the display
+        self.scale = scale  # None picks the biggest whole number scale that fits the window
+        self.render_size = None
+        self.viewport = None  # the part of the window the game picture is shown in
+        self.scaled = None  # where the game picture is scaled to, part of the window when it fits
+        self.bars = []  # the parts of the window around the game picture
+
+    def set_render_size(self, render_size):
+        """Works out where the game picture goes in the window and sets up the surface it is scaled into."""
+        window_rect = self.window.get_rect()
+        scale = self.scale
+        if scale is None:
+            scale = max(1, min(window_rect.width // render_size[0], window_rect.height // render_size[1]))
+        self.render_size = render_size
+        self.viewport = pygame.Rect(0, 0, render_size[0] * scale, render_size[1] * scale)
+        self.viewport.center = window_rect.center
+        if window_rect.contains(self.viewport):
+            self.scaled = self.window.subsurface(self.viewport)  # scaled straight into the window
+        else:
+            self.scaled = pygame.Surface(self.viewport.size, 0, self.window)  # too big, shown cut off
+        visible = self.viewport.clip(window_rect)
+        self.bars = [bar for bar in (pygame.Rect(0, 0, window_rect.width, visible.top),
+                                     pygame.Rect(0, visible.bottom, window_rect.width,
+                                                 window_rect.height - visible.bottom),
+                                     pygame.Rect(0, visible.top, visible.left, visible.height),
+                                     pygame.Rect(visible.right, visible.top, window_rect.width - visible.right,
+                                                 visible.height)) if bar.width > 0 and bar.height > 0]
+
+    def mark_all(self):
+        """Asks for the whole window to be shown."""
+        self.full = True
+
+    def mark_dirty(self, rect):
+        """Asks for one part of the window to be shown."""
+        self.dirty.append(pygame.Rect(rect))
+
+    def compose(self, render_surface):
+        """Scales the game picture up into the window and asks for the whole window to be shown."""
+        if render_surface.get_size() != self.render_size:
+            self.set_render_size(render_surface.get_size())
+        pygame.transform.scale(render_surface, self.viewport.size, self.scaled)
+        if self.scaled.get_parent() is None:
+            self.window.blit(self.scaled, self.viewport)
+        for bar in self.bars:
+            self.window.fill((0, 0, 0), bar)  # other screens may have drawn there
+        self.mark_all()
+
+    def present(self):
+        """Sends what changed this frame to the display. Called once at the end of every frame."""
+        if self.full:
+            pygame.display.flip()
+            self.presents += 1
+        elif self.dirty:
+            pygame.display.update(self.dirty)
+            self.presents += 1
+        self.full = False
+        self.dirty.clear()
@@ -0,0 +1,222 @@
+"""
+This file holds the code for letting bots and agents play the game without a window.
+The Environment class wraps one Adventure behind a reset/step interface. It never draws anything: a step sets the keys
+the action stands for and runs simulation ticks only, as fast as the computer can. After every step it gives back an
+observation made of numpy arrays (see the layout below), a reward and whether the run is over.
+The VectorEnvironment class runs many independent games split over worker processes, so the steps of different games
+run on different cores. Each worker plays its games one after the other and sends back all their observations stacked
+into one array per part, so there is only one message per worker and step.
+SDL's dummy video and audio drivers are used unless other drivers were chosen, so no window is opened and no sound is
+played.
+
+Layout of an observation (a dict of numpy arrays):
+    player: x, y and how far the player moved in x and y during the last tick
+    tiles: 1 for every solid tile in the OBSERVATION_RADIUS tiles around the player (rows go down, columns go right)
+    enemies: present, x and y distance from the player and x speed of the MAX_ENEMIES closest enemies (0 when absent)
+    artifacts: present, x and y distance from the player of the MAX_ARTIFACTS closest bones that are left
+    level: the number of the current map in MAPS
+"""
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import multiprocessing
+import random
+import numpy as np
+from everythingbutmain.Levels import NEXT_LEVEL
+from MainGame import Adventure
+
+MAPS = ['heaven.json', 'hell.json', 'map.json', 'map2.json']
+# the keys every action holds down: (left, right, jump)
+ACTIONS = [
+    (False, False, False),
+    (True, False, False),
+    (False, True, False),
+    (False, False, True),
+    (True, False, True),
+    (False, True, True),
+]
+OBSERVATION_RADIUS = 5  # tiles around the player in the observation
+MAX_ENEMIES = 8
+MAX_ARTIFACTS = 8
+MAX_STEPS = 3600  # a run is cut off after this many steps (one minute of game time at one tick per step)
+ARTIFACT_REWARD = 1.0
+LEVEL_REWARD = 10.0  # for reaching the level that comes after the current one
+DEATH_REWARD = -1.0
+
+
+class Environment:
+    def __init__(self, currentMap='heaven.json', seed=None, ticks_per_step=1, max_steps=MAX_STEPS, **game_options):
+        """Makes a game to play. game_options go to Adventure (e.g. tick_rate)."""
+        self.starting_map = currentMap
+        self.ticks_per_step = ticks_per_step  # how many ticks every action is held for
+        self.max_steps = max_steps
+        self.game = Adventure(currentMap, frame_rate=0, seed=seed, **game_options)
+        self.steps = 0
+
+    def reset(self, seed=None, currentMap=None):
+        """Starts a new run on a map (the starting map if none is given). Returns the first observation."""
+        if seed is not None:
+            self.game.rng = random.Random(seed)
+        currentMap = currentMap if currentMap is not None else self.starting_map
+        if currentMap == self.game.currentMap:
+            self.game.respawn()  # the map is already loaded, only the player and the entities start over
+        else:
+            self.game.load_level(currentMap)
+        self.steps = 0
+        return self.observe()
+
+    def step(self, action):
+        """Holds the keys of an action (a number in ACTIONS) for ticks_per_step ticks.
+        Returns (observation, reward, done, info). The run is done when the player dies, the level changes or
+        max_steps steps were taken, after that reset has to be called."""
+        game = self.game
+        left, right, jump = ACTIONS[action]
+        game.movement_status = [left, right]
+        if jump:
+            game.avatar.avatar_velocity[1] = -2  # the same as pressing the up key
+        currentMap = game.currentMap
+        respawns = game.levels.respawns
+        reward = 0.0
+        died = changed = False
+        for _ in range(self.ticks_per_step):
+            bones = len(game.artifacts.not_picked_up)
+            game.tick()
+            died = game.levels.respawns != respawns
+            changed = game.currentMap != currentMap
+            if died or changed:  # the bones were put back, so they are not counted
+                break
+            reward += (bones - len(game.artifacts.not_picked_up)) * ARTIFACT_REWARD
+        if died:
+            reward += DEATH_REWARD
+        if changed and game.currentMap == NEXT_LEVEL[currentMap]:
+            reward += LEVEL_REWARD
+        self.steps += 1
+        truncated = self.steps >= self.max_steps
+        info = {'map': game.currentMap, 'died': died, 'level_changed': changed, 'truncated': truncated}
+        return self.observe(), reward, died or changed or truncated, info
+
+    def observe(self):
+        """Gives the observation of the game as it is now."""
+        game = self.game
+        avatar = game.avatar
+        x, y = avatar.position
+        player = np.array([x, y, x - avatar.previous_position[0], y - avatar.previous_position[1]], dtype=np.float32)
+
+        size = 2 * OBSERVATION_RADIUS + 1
+        tiles = np.zeros((size, size), dtype=np.uint8)
+        tile_x = int(x // game.tile_dimension) - OBSERVATION_RADIUS
+        tile_y = int(y // game.tile_dimension) - OBSERVATION_RADIUS
+        for row in range(size):
+            for column in range(size):
+                tiles[row, column] = game.solid_grid.is_solid(tile_x + column, tile_y + row)
+
+        ghosts = game.ghosts
+        enemies = np.zeros((MAX_ENEMIES, 4), dtype=np.float32)
+        distance_x = ghosts.x - x
+        distance_y = ghosts.y - y
+        closest = np.argsort(distance_x * distance_x + distance_y * distance_y)[:MAX_ENEMIES]
+        enemies[:len(closest), 0] = 1
+        enemies[:len(closest), 1] = distance_x[closest]
+        enemies[:len(closest), 2] = distance_y[closest]
+        enemies[:len(closest), 3] = ghosts.velocity_x[closest]
+
+        artifacts = np.zeros((MAX_ARTIFACTS, 3), dtype=np.float32)
+        left = np.array([imageAndPosition[1] for imageAndPosition in game.artifacts.not_picked_up.values()],
+                        dtype=np.float32).reshape(-1, 2) - (x, y)
+        closest = np.argsort((left * left).sum(axis=1))[:MAX_ARTIFACTS]
+        artifacts[:len(closest), 0] = 1
+        artifacts[:len(closest), 1:] = left[closest]
+
+        return {'player': player, 'tiles': tiles, 'enemies': enemies, 'artifacts': artifacts,
+                'level': np.int32(MAPS.index(game.currentMap))}
+
+
+def stack(observations):
+    """Turns a list of observations into one observation with an array per part, one row per game."""
+    return {part: np.stack([observation[part] for observation in observations]) for part in observations[0]}
+
+
+def stack_parts(parts):
+    """Joins the stacked observations of the workers into one."""
+    return {part: np.concatenate([observation[part] for observation in parts]) for part in parts[0]}
+
+
+def worker(connection, count, options):
+    """Runs in a worker process. Plays count games and answers the commands of the VectorEnvironment."""
+    environments = [Environment(**options) for _ in range(count)]
+    while True:
+        command, data = connection.recv()
+        if command == 'reset':
+            connection.send(stack([environment.reset(seed) for environment, seed in zip(environments, data)]))
+        elif command == 'step':
+            results = []
+            for environment, action in zip(environments, data):
+                observation, reward, done, info = environment.step(action)
+                if done:  # a finished game starts again right away, its last observation is kept in the info
+                    info['final_observation'] = observation
+                    observation = environment.reset()
+                results.append((observation, reward, done, info))
+            connection.send((stack([result[0] for result in results]),
+                             np.array([result[1] for result in results], dtype=np.float32),
+                             np.array([result[2] for result in results], dtype=bool),
+                             [result[3] for result in results]))
+        elif command == 'close':
+            connection.close()
+            return
+
+
+class VectorEnvironment:
+    def __init__(self, count, workers=None, **options):
+        """Starts count games split over worker processes (one per core if workers is not given). options go to
+        every Environment."""
+        workers = min(count, workers or os.cpu_count() or 1)
+        self.count = count
+        self.connections = []
+        self.processes = []
+        self.sizes = [count // workers + (number < count % workers) for number in range(workers)]
+        context = multiprocessing.get_context('spawn')  # a fresh process, so no pygame state is copied over
+        for size in self.sizes:
+            parent, child = context.Pipe()
+            process = context.Process(target=worker, args=(child, size, options), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def split(self, values):
+        """Cuts a list with one value per game into one list per worker."""
+        parts = []
+        start = 0
+        for size in self.sizes:
+            parts.append(list(values[start:start + size]))
+            start += size
+        return parts
+
+    def reset(self, seeds=None):
+        """Starts a new run in every game. Returns the stacked observations."""
+        seeds = seeds if seeds is not None else [None] * self.count
+        for connection, part in zip(self.connections, self.split(seeds)):
+            connection.send(('reset', part))
+        return stack_parts([connection.recv() for connection in self.connections])
+
+    def step(self, actions):
+        """Takes one step in every game, all workers at the same time. Returns the stacked observations and arrays of
+        the rewards and done flags, plus a list of infos. A game that is done is reset right away."""
+        for connection, part in zip(self.connections, self.split(actions)):
+            connection.send(('step', part))
+        results = [connection.recv() for connection in self.connections]
+        infos = []
+        for result in results:
+            infos.extend(result[3])
+        return (stack_parts([result[0] for result in results]), np.concatenate([result[1] for result in results]),
+                np.concatenate([result[2] for result in results]), infos)
+
+    def close(self):
+        """Stops the worker processes."""
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.processes:
+            process.join()
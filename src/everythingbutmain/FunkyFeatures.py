@@ -1,16 +1,25 @@
 """
 This file holds the code for the NPCs and the bones.
 The artifacts class takes in the adventure class as a parameter. It puts the artifacts (bones) in random spots on the
-screen every time the level is restarted. It also allows the player to collide with them and collect them.
+screen every time the level is restarted. The spots come from the level's free-space index (see FreeSpace.py). It also allows the player to collide with them and collect them.
 The NPCs class is a child class of the avatar class. It puts the NPC on the screen at a set position. It also checks
 for the player colliding with it.
+Both register themselves with the game's broadphase (see Broadphase.py) so only the ones near the player are checked.
 The NPCMessage class controls the message that pops up on the screen when the player collides with it. It draws the text
 box and text on the screen.
 """
 
 import pygame
-import random
 from everythingbutmain.Sprites import Avatar
+from everythingbutmain.TextCache import TEXT
+
+# where the bones can be put on each map, as ((first x, last x), (first y, last y)) in pixels
+SPAWN_REGIONS = {
+    'heaven.json': ((-484, 800), (40, 80)),
+    'hell.json': ((-484, 266), (40, 50)),
+    'map.json': ((0, 400), (20, 50)),
+    'map2.json': ((0, 500), (-9, 50)),
+}
 
 
 class Artifacts:
@@ -18,48 +27,26 @@ class Artifacts:
         """Puts the collectable bones in random places on the map."""
         self.maingame = maingame
         self.not_picked_up = {}
-        i = 0
-        if self.maingame.currentMap == 'heaven.json':
-            for artifact in maingame.resources['artifacts']:
-                random_x = random.randint(-484, 800)
-                random_y = random.randint(40, 80)
-                while self.maingame.physics_rectangles([random_x, random_y]):
-                    random_x = random.randint(-484, 800)
-                    random_y = random.randint(40, 80)
-                self.not_picked_up[i] = [artifact, [random_x, random_y]]
-                i += 1
-        if self.maingame.currentMap == 'hell.json':
-            for artifact in maingame.resources['artifacts']:
-                random_x = random.randint(-484, 266)
-                random_y = random.randint(40, 50)
-                while self.maingame.physics_rectangles([random_x, random_y]):
-                    random_x = random.randint(-484, 266)
-                    random_y = random.randint(40, 50)
-                self.not_picked_up[i] = [artifact, [random_x, random_y]]
-                i += 1
-
-        if self.maingame.currentMap == 'map.json':
-            for artifact in maingame.resources['artifacts']:
-                random_x = random.randint(0, 400)
-                random_y = random.randint(20, 50)
-                while self.maingame.physics_rectangles([random_x, random_y]):
-                    random_x = random.randint(0, 400)
-                    random_y = random.randint(20, 50)
-                self.not_picked_up[i] = [artifact, [random_x, random_y]]
-                i += 1
-        if self.maingame.currentMap == 'map2.json':
-            for artifact in maingame.resources['artifacts']:
-                random_x = random.randint(0, 500)
-                random_y = random.randint(-9, 50)
-                while self.maingame.physics_rectangles([random_x, random_y]):
-                    random_x = random.randint(0, 500)
-                    random_y = random.randint(-9, 50)
-                self.not_picked_up[i] = [artifact, [random_x, random_y]]
-                i += 1
+        # every bone goes on a free spot of the level's spawn region, picked straight from the free-space index
+        free_space = self.maingame.spawn_index()
+        for i, artifact in enumerate(maingame.resources['artifacts']):
+            self.not_picked_up[i] = [artifact, free_space.sample(self.maingame.rng)]
 
         self.canDogMoveOn = False
         self.distance = (-2, -2)
 
+        # register every bone with the broadphase so the player only checks the bones near it
+        for variantName, imageAndPosition in self.not_picked_up.items():
+            self.maingame.broadphase.insert(('artifact', variantName), self.artifact_rect(imageAndPosition))
+
+    def artifact_rect(self, imageAndPosition):
+        """Gives the rectangle the player has to touch to pick up a bone."""
+        artifact_position = (imageAndPosition[1][0] + self.distance[0],
+                             imageAndPosition[1][1] + self.distance[1])
+        return pygame.Rect(artifact_position[0], artifact_position[1],
+                           imageAndPosition[0].get_width(),
+                           imageAndPosition[0].get_height())
+
     def drawArtifacts(self, surface, distanceFromCamera=(0, 0)):
         """Draws the bones on the screen."""
         for variantName, imageAndPosition in self.not_picked_up.items():
@@ -69,19 +56,13 @@ class Artifacts:
     def check_collision_with_artifacts(self, player_rect):
         """Check if the player collides with the bones. If they do the bone gets deleted."""
         to_remove = []
-        for variantName, imageAndPosition in self.not_picked_up.items():
-            artifact_position = (imageAndPosition[1][0] + self.distance[0],
-                                 imageAndPosition[1][1] + self.distance[1])
-
-            artifact_rect = pygame.Rect(artifact_position[0], artifact_position[1],
-                                        imageAndPosition[0].get_width(),
-                                        imageAndPosition[0].get_height())
-
-            if player_rect.colliderect(artifact_rect):
+        for kind, variantName in self.maingame.broadphase.candidates(player_rect, 'artifact'):
+            if player_rect.colliderect(self.artifact_rect(self.not_picked_up[variantName])):
                 to_remove.append(variantName)
 
         for item in to_remove:
             del self.not_picked_up[item]
+            self.maingame.broadphase.remove(('artifact', item))
 
         if not self.not_picked_up:
             self.canDogMoveOn = True
@@ -105,6 +86,13 @@ class NPCs(Avatar):
 
         if self.maingame.currentMap == 'map2.json':
             self.position = [742, 6]
+        self.previous_position = list(self.position)  # the NPCs stand still
+        self.maingame.broadphase.insert(('npc', self.avatar_type), self.NPC_rect())
+
+    def NPC_rect(self):
+        """Gives the rectangle the player has to touch to talk to the NPC."""
+        NPC_position = (self.position[0] + self.distance[0], self.position[1] + self.distance[1])
+        return pygame.Rect(NPC_position[0], NPC_position[1], self.size[0], self.size[1])
 
     def drawNPC(self, surface, distanceFromCamera=(0, 0)):
         """Draws the NPC on the screen."""
@@ -112,10 +100,9 @@ class NPCs(Avatar):
 
     def check_collision_with_NPC(self, player_rect, surface, distanceFromCamera=(0, 0)):
         """Checks for the player colliding with the NPC."""
-        NPC_position = (self.position[0] + self.distance[0], self.position[1] + self.distance[1])
-        NPC_rect = pygame.Rect(NPC_position[0], NPC_position[1], self.size[0], self.size[1])
-
-        if player_rect.colliderect(NPC_rect):
+        if ('npc', self.avatar_type) not in self.maingame.broadphase.candidates(player_rect, 'npc'):
+            return None  # the NPC is not in the cells around the player
+        if player_rect.colliderect(self.NPC_rect()):
             return True
 
 
@@ -129,7 +116,8 @@ class NPCMessage:
         self.width = 120
         self.height = 55
         self.color = pygame.Color('pink')
-        self.font = pygame.font.SysFont('Arial', 10)
+        self.font_name = 'Arial'
+        self.font_size = 10
         self.canDogMoveOn = canDogMoveOn
 
     def setMessage(self, message):
@@ -141,10 +129,6 @@ class NPCMessage:
         rect = pygame.Rect(self.x_position - distanceFromCamera[0],
                            self.y_position - distanceFromCamera[1],
                            self.width, self.height)
-        text_surface = self.font.render(self.message, True, pygame.Color('black'))
-        text_rect = text_surface.get_rect()
-        text_rect.x = rect.x + 5
-        text_rect.y = rect.y + 5
         if not self.maingame.artifacts.canDogMoveOn:
             self.setMessage('You have not collected\nall magical bones.\nGo back to collect\nmagical bones.')
         else:
@@ -158,9 +142,9 @@ class NPCMessage:
         lines = self.message.splitlines()
         y_offset = 1  # Initial y offset inside the rectangle
 
-        # Render each line separately
+        # Render each line separately (the text cache only renders each line once)
         for line in lines:
-            text_surface = self.font.render(line, True, pygame.Color('black'))
+            text_surface = TEXT.render(line, self.font_name, self.font_size, 'black')
             text_rect = text_surface.get_rect()
             text_rect.x = rect.x + 5  # Horizontal padding inside the rectangle
             text_rect.y = rect.y + y_offset  # Vertical position for each line
@@ -0,0 +1,65 @@
+"""
+This file holds the code that switches between the levels.
+The LevelManager class keeps track of which level should be played next. The game asks it to change the level or to
+respawn the player while a frame is running, and the switch happens at the end of that frame. Only the level itself
+(the map, the music and the entities) gets swapped, the game window and the loaded pictures are kept.
+The tables at the top say which music, resources and next level belong to each map.
+"""
+
+LEVEL_MUSIC = {
+    'heaven.json': 'artifacts/heaven.mp3',
+    'hell.json': 'artifacts/hell.mp3',
+    'map.json': 'artifacts/backgroundmusic.mp3',
+    'map2.json': 'artifacts/earth.mp3',
+}
+
+# the resources every level uses
+COMMON_ASSETS = ['player/thing', 'player/run', 'player/idle', 'player/jump', 'artifacts', 'float']
+
+# the resources that only some levels use (background, tiles, enemies and NPC)
+LEVEL_ASSETS = {
+    'heaven.json': ['heaven-sunset', 'stone', 'cloud', 'water', 'dove', 'dove/flipped', 'NPC/willowisp'],
+    'hell.json': ['hell', 'lava', 'magma', 'large_decor', 'dragon', 'dragon/flipped', 'NPC/fluffy'],
+    'map.json': ['background', 'stone', 'grass', 'water', 'decor', 'large_decor', 'ghost/left', 'NPC/tomato'],
+    'map2.json': ['forest-background', 'stone', 'grass', 'water', 'decor', 'large_decor', 'seaMonster',
+                  'seaMonster/flipped', 'NPC/Chipmunk'],
+}
+
+# the level that comes after finishing each level
+NEXT_LEVEL = {
+    'heaven.json': 'map.json',
+    'hell.json': 'map.json',
+    'map.json': 'map2.json',
+    'map2.json': None,
+}
+
+
+class LevelManager:
+    def __init__(self, game):
+        """Keeps track of the level switches the game asked for."""
+        self.game = game
+        self.pending = None
+        self.respawns = 0  # how many times the player died, read by the headless environment
+
+    def change_level(self, currentMap):
+        """Asks for a different level to be loaded at the end of the frame."""
+        self.pending = currentMap
+
+    def respawn(self):
+        """Asks for the current level to be restarted at the end of the frame, unless a different level was already
+        asked for (reaching the next level wins over dying in the same frame)."""
+        if self.pending is None:
+            self.pending = self.game.currentMap
+
+    def apply(self):
+        """Loads the level that was asked for during the frame. Returns True if something changed."""
+        if self.pending is None:
+            return False
+        currentMap = self.pending
+        self.pending = None
+        if currentMap == self.game.currentMap:
+            self.respawns += 1
+            self.game.respawn()
+        else:
+            self.game.load_level(currentMap)
+        return True
@@ -0,0 +1,211 @@
+"""
+This file holds the code for the maps in memory and the compiled map files.
+The TileMap class keeps the grid tiles of a map in two flat bytearrays (one for the tile type and one for the variant)
+instead of a dictionary of "x;y" strings. The tile type names are stored once in a list and the grid only holds their
+index. The offgrid tiles (the decor that is not on the grid) are kept in a small table.
+A map can be made from the .json maps or loaded from a compiled .djmap file, which is read with a single read straight
+into the arrays. compile_map turns a .json map into a .djmap file.
+Maps that are too big to keep in memory can be compiled into a .djworld file instead, which is read a chunk at a time
+(see ChunkedMap.py). A TileMap answers the same questions as a ChunkedMap, so the rest of the game works with both.
+
+Layout of a .djmap file (little endian):
+    header: magic, version, tile size, origin x, origin y, width, height, number of types, number of offgrid tiles
+    type names: one length byte and the utf-8 name for each type
+    types: width * height bytes, 0 is an empty cell, otherwise the index of the type name plus one
+    variants: width * height bytes
+    offgrid: type index, variant, x and y for each offgrid tile
+"""
+
+import json
+import os
+import struct
+
+MAGIC = b'DJMP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHiiIIHI')
+OFFGRID = struct.Struct('<BBff')
+EMPTY = 0
+COMPILED_EXTENSION = '.djmap'
+WORLD_EXTENSION = '.djworld'
+
+
+class TileMap:
+    streamed = False  # the whole map is in memory
+    def __init__(self, tile_size, origin_x=0, origin_y=0, width=0, height=0, type_names=None, types=None,
+                 variants=None, offgrid=None):
+        """The tiles of one map stored in flat arrays."""
+        self.tile_size = tile_size
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.width = width
+        self.height = height
+        self.type_names = type_names if type_names is not None else []
+        self.type_ids = {name: index + 1 for index, name in enumerate(self.type_names)}
+        self.types = types if types is not None else bytearray(width * height)
+        self.variants = variants if variants is not None else bytearray(width * height)
+        self.offgrid = offgrid if offgrid is not None else []
+
+    @classmethod
+    def from_json(cls, level_data):
+        """Makes the arrays from the dictionary of a .json map."""
+        tiles = list(level_data['tilemap'].values())
+        if tiles:
+            min_x = min(tile['pos'][0] for tile in tiles)
+            min_y = min(tile['pos'][1] for tile in tiles)
+            width = max(tile['pos'][0] for tile in tiles) - min_x + 1
+            height = max(tile['pos'][1] for tile in tiles) - min_y + 1
+        else:
+            min_x = min_y = width = height = 0
+        tile_map = cls(level_data['tile_size'], min_x, min_y, width, height, offgrid=level_data['offgrid'])
+        for tile in tiles:
+            tile_map.set(tile['pos'][0], tile['pos'][1], tile['type'], tile['variant'])
+        return tile_map
+
+    def intern(self, type_name):
+        """Gives the number stored in the grid for a tile type, adding the type if it is new."""
+        if type_name not in self.type_ids:
+            self.type_names.append(type_name)
+            self.type_ids[type_name] = len(self.type_names)
+        return self.type_ids[type_name]
+
+    def index(self, x, y):
+        """Gives the position in the arrays of a grid position, or -1 if it is outside of the map."""
+        x -= self.origin_x
+        y -= self.origin_y
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return -1
+
+    def get(self, x, y):
+        """Gives (type, variant) of the tile at a grid position, or None if there is no tile."""
+        index = self.index(x, y)
+        if index < 0 or self.types[index] == EMPTY:
+            return None
+        return self.type_names[self.types[index] - 1], self.variants[index]
+
+    def set(self, x, y, type_name, variant=0):
+        """Puts a tile at a grid position (or removes it when type_name is None), growing the map if needed."""
+        index = self.index(x, y)
+        if index < 0:
+            if type_name is None:
+                return
+            self.resize(min(x, self.origin_x), min(y, self.origin_y),
+                        max(x, self.origin_x + self.width - 1), max(y, self.origin_y + self.height - 1))
+            index = self.index(x, y)
+        if type_name is None:
+            self.types[index] = EMPTY
+            self.variants[index] = 0
+        else:
+            self.types[index] = self.intern(type_name)
+            self.variants[index] = variant
+
+    def resize(self, min_x, min_y, max_x, max_y):
+        """Makes the arrays cover the given bounds and keeps the tiles already in them."""
+        width = max_x - min_x + 1
+        height = max_y - min_y + 1
+        types = bytearray(width * height)
+        variants = bytearray(width * height)
+        for y in range(self.height):
+            start = (y + self.origin_y - min_y) * width + self.origin_x - min_x
+            types[start:start + self.width] = self.types[y * self.width:(y + 1) * self.width]
+            variants[start:start + self.width] = self.variants[y * self.width:(y + 1) * self.width]
+        self.origin_x, self.origin_y, self.width, self.height = min_x, min_y, width, height
+        self.types, self.variants = types, variants
+
+    def tiles(self):
+        """Goes through every grid tile as (x, y, type, variant)."""
+        types = self.types
+        for index in range(len(types)):
+            if types[index] != EMPTY:
+                yield (index % self.width + self.origin_x, index // self.width + self.origin_y,
+                       self.type_names[types[index] - 1], self.variants[index])
+
+    def stream(self, rect):
+        """Nothing to read ahead, the whole map is in memory."""
+
+    def offgrid_in(self, rect):
+        """Gives the offgrid tiles that can be seen in a rectangle in pixels."""
+        return self.offgrid
+
+    def to_json(self):
+        """Turns the map back into the dictionary used by the .json maps."""
+        tilemap = {}
+        for x, y, type_name, variant in self.tiles():
+            tilemap[str(x) + ';' + str(y)] = {'type': type_name, 'variant': variant, 'pos': [x, y]}
+        return {'tilemap': tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid}
+
+    def save(self, path):
+        """Writes the map as a compiled .djmap file."""
+        offgrid = b''.join(OFFGRID.pack(self.intern(tile['type']), tile['variant'], tile['pos'][0], tile['pos'][1])
+                           for tile in self.offgrid)
+        # the names are packed last so types only used by offgrid tiles are in the list too
+        names = b''.join(struct.pack('<B', len(name.encode('utf-8'))) + name.encode('utf-8')
+                         for name in self.type_names)
+        header = HEADER.pack(MAGIC, VERSION, self.tile_size, self.origin_x, self.origin_y, self.width, self.height,
+                             len(self.type_names), len(self.offgrid))
+        with open(path, 'wb') as f:
+            f.write(header + names + bytes(self.types) + bytes(self.variants) + offgrid)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a compiled .djmap file with a single read."""
+        data = bytearray(os.path.getsize(path))
+        with open(path, 'rb') as f:
+            f.readinto(data)
+        view = memoryview(data)
+        magic, version, tile_size, origin_x, origin_y, width, height, type_count, offgrid_count = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a compiled map this version of the game can read')
+        at = HEADER.size
+        type_names = []
+        for _ in range(type_count):
+            length = data[at]
+            type_names.append(bytes(view[at + 1:at + 1 + length]).decode('utf-8'))
+            at += 1 + length
+        cells = width * height
+        types = view[at:at + cells]
+        variants = view[at + cells:at + 2 * cells]
+        at += 2 * cells
+        offgrid = []
+        for type_id, variant, x, y in OFFGRID.iter_unpack(view[at:at + offgrid_count * OFFGRID.size]):
+            offgrid.append({'type': type_names[type_id - 1], 'variant': variant, 'pos': [x, y]})
+        return cls(tile_size, origin_x, origin_y, width, height, type_names, types, variants, offgrid)
+
+
+def compiled_path(path):
+    """Gives the name of the compiled file that belongs to a .json map."""
+    return os.path.splitext(path)[0] + COMPILED_EXTENSION
+
+
+def world_path(path):
+    """Gives the name of the chunked world file that belongs to a .json map."""
+    return os.path.splitext(path)[0] + WORLD_EXTENSION
+
+
+def is_newer(compiled, path):
+    """Checks if a compiled file exists and is not older than the .json map it was made from."""
+    return os.path.exists(compiled) and (not os.path.exists(path) or
+                                         os.path.getmtime(compiled) >= os.path.getmtime(path))
+
+
+def compile_map(path):
+    """Turns a .json map into a compiled .djmap file next to it."""
+    with open(path, 'r') as f:
+        tile_map = TileMap.from_json(json.load(f))
+    tile_map.save(compiled_path(path))
+    return compiled_path(path)
+
+
+def load_map(path):
+    """Loads a map, using its compiled file when there is one that is newer than the .json map. When there is a
+    .djworld file newer than both, the map is streamed from it instead."""
+    compiled = compiled_path(path)
+    world = world_path(path)
+    if is_newer(world, path) and not (is_newer(compiled, path) and os.path.getmtime(compiled) > os.path.getmtime(world)):
+        from everythingbutmain.ChunkedMap import ChunkedMap  # imported here because ChunkedMap builds on this file
+        return ChunkedMap(world)
+    if is_newer(compiled, path):
+        return TileMap.load(compiled)
+    with open(path, 'r') as f:
+        return TileMap.from_json(json.load(f))
@@ -0,0 +1,219 @@
+"""
+This file holds the code for the falling leaves and the other small things that float around a level.
+The ParticleSystem class makes the particles of the emitters of the current level (see EMITTERS). Every particle is one
+slot in the numpy arrays below, so moving all of them is a few array operations per tick no matter how many there are.
+A particle that has fallen past its emitter's until_y or lived longer than its life is started again at its emitter in
+the same slot, so no arrays are made or grown while the level is played. Drawing only looks at the particles the camera
+sees. The particles of emitters that look the same are drawn together: pictures with a single blits call, and small
+squares are written straight into the pixels of the surface, so thousands of them cost about as much as a few blits.
+A level with only a few particles (like the leaves) skips the arrays when drawing, since for a handful of particles
+the numpy calls cost more than the work they do.
+
+An emitter is a dict with:
+    picture: the resource to draw (its first picture), or colour and size for a small square made here
+    count: how many particles it has
+    area: ((first x, last x), (first y, last y)) where its particles start
+    first: the area its particles are in when the level starts (area if not given)
+    velocity: ((lowest x speed, highest x speed), (lowest y speed, highest y speed)) in pixels per 1/60 s
+    until_y: a particle starts again once it is this low (optional)
+    life: a particle starts again after this many 1/60 s (optional)
+    prewarm: start the particles at a random point of their life, so the level does not begin with all of them at
+             the start (optional)
+"""
+
+import numpy as np
+import pygame
+
+# the leaves fall from the trees, the two pictures of a leaf are two particles that fall together. They start again at
+# the same ticks as the old leaves did, but are only the same to within 0.2 pixels: the old code also moved the leaves
+# of the other tree half a step whenever one tree's leaf started again, which emitters that do not know about each other
+# can not copy
+LEAF_SPEED = ((0.1, 0.1), (0.3, 0.3))  # map.json moved its leaves twice every tick
+RECYCLE_TICKS = 16  # particles with a life are started again together every this many ticks
+FEW_PARTICLES = 32  # up to this many particles are drawn one by one, numpy only pays off for more
+EMITTERS = {
+    'map.json': [
+        {'picture': 'float', 'count': 1, 'area': ((346.0, 346.0), (58.0, 58.0)), 'velocity': LEAF_SPEED,
+         'until_y': 118.0},
+        {'picture': 'float', 'count': 1, 'area': ((321.0, 321.0), (40.0, 40.0)), 'velocity': LEAF_SPEED,
+         'until_y': 100.0},
+        {'picture': 'float', 'count': 1, 'area': ((200.0, 200.0), (60.5, 60.5)), 'velocity': ((-0.1, -0.1), (0.3, 0.3)),
+         'until_y': 108.0},
+        {'picture': 'float', 'count': 1, 'area': ((183.0, 183.0), (42.5, 42.5)), 'velocity': ((-0.1, -0.1), (0.3, 0.3)),
+         'until_y': 90.0},
+    ],
+    'map2.json': [
+        {'picture': 'float', 'count': 1, 'first': ((715.0, 715.0), (24.0, 24.0)),
+         'area': ((708.0, 708.0), (18.0, 18.0)), 'velocity': ((0.05, 0.05), (0.15, 0.15)), 'until_y': 38.0},
+        {'picture': 'float', 'count': 1, 'first': ((690.0, 690.0), (6.0, 6.0)),
+         'area': ((683.0, 683.0), (0.0, 0.0)), 'velocity': ((0.05, 0.05), (0.15, 0.15)), 'until_y': 20.0},
+    ],
+}
+
+
+class ParticleSystem:
+    def __init__(self, maingame, emitters=None):
+        """Makes every particle of the current level's emitters (or of the emitters given)."""
+        self.maingame = maingame
+        self.emitters = emitters if emitters is not None else EMITTERS.get(maingame.currentMap, [])
+        self.rng = np.random.default_rng(maingame.rng.getrandbits(32))  # the game's seed gives the same particles
+
+        # the particles of an emitter are the slots from its start to its end, emitters next to each other that look
+        # the same are drawn as one group
+        self.slices = []
+        self.groups = []  # [picture, colour, size, first slot, end slot], colour is None for a picture
+        count = 0
+        for emitter in self.emitters:
+            self.slices.append(slice(count, count + emitter['count']))
+            look = self.look(emitter)
+            if self.groups and self.groups[-1][:3] == look:
+                self.groups[-1][4] += emitter['count']
+            else:
+                self.groups.append(look + [count, count + emitter['count']])
+            count += emitter['count']
+        self.size = np.zeros((2, count))  # width and height of the picture of every particle, for culling
+        for picture, colour, size, first, end in self.groups:
+            self.size[:, first:end] = [[picture.get_width()], [picture.get_height()]] if picture is not None else size
+
+        # where each particle starts again and how fast it can go, copied from its emitter. Every array has a row for
+        # x and a row for y, so both are done by the same operation
+        self.spawn_low = np.zeros((2, count))
+        self.spawn_high = np.zeros((2, count))
+        self.speed_low = np.zeros((2, count))
+        self.speed_high = np.zeros((2, count))
+        self.until_y = np.full(count, np.inf)
+        self.life = np.full(count, np.inf)
+        for emitter, part in zip(self.emitters, self.slices):
+            (first_x, last_x), (first_y, last_y) = emitter['area']
+            (low_x, high_x), (low_y, high_y) = emitter['velocity']
+            self.spawn_low[:, part] = [[first_x], [first_y]]
+            self.spawn_high[:, part] = [[last_x], [last_y]]
+            self.speed_low[:, part] = [[low_x], [low_y]]
+            self.speed_high[:, part] = [[high_x], [high_y]]
+            self.until_y[part] = emitter.get('until_y', np.inf)
+            self.life[part] = emitter.get('life', np.inf)
+
+        self.tick_scale = maingame.tick_scale  # the speeds are per 1/60 s
+        self.position = np.zeros((2, count))
+        self.step = np.zeros((2, count))  # how far every particle moves in one tick
+        self.ticks = 0  # ticks since the level started
+        self.done_at = np.zeros(count)  # the tick every particle starts again at
+        self.life = np.ceil(self.life / self.tick_scale)  # in ticks from here on
+        self.start(np.arange(count))
+        for emitter, part in zip(self.emitters, self.slices):
+            if 'first' in emitter:
+                (first_x, last_x), (first_y, last_y) = emitter['first']
+                self.position[0, part] = self.rng.uniform(first_x, last_x, emitter['count'])
+                self.position[1, part] = self.rng.uniform(first_y, last_y, emitter['count'])
+                self.done_at[part] = self.fall_time(part)
+            if emitter.get('prewarm') and 'life' in emitter:
+                age = self.rng.integers(0, self.life[part], emitter['count'])
+                self.position[:, part] += self.step[:, part] * age
+                self.done_at[part] -= age
+        self.batch(np.arange(count))
+        self.soonest = float(self.done_at.min(initial=np.inf))  # nothing has to be started again before this tick
+        self.few = count <= FEW_PARTICLES
+
+    def look(self, emitter):
+        """Gives [picture, colour, size] of the particles of an emitter. Small squares have no picture, they are put
+        straight into the pixels of the surface."""
+        if 'picture' in emitter:
+            return [self.maingame.resources[emitter['picture']][0], None, None]
+        return [None, tuple(emitter['colour']), emitter['size']]
+
+    def fall_time(self, slots):
+        """Gives the tick at which particles that are where they are now fall past until_y or reach the end of their
+        life."""
+        falling = self.step[1, slots] > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ticks = np.where(falling, (self.until_y[slots] - self.position[1, slots]) / self.step[1, slots], np.inf)
+        return self.ticks + np.minimum(np.ceil(ticks - 1e-9), self.life[slots])
+
+    def batch(self, slots):
+        """Moves the tick at which particles with a life start again up to the next multiple of RECYCLE_TICKS, so they
+        are started again together, a few ticks late at most."""
+        done_at = self.done_at[slots]
+        self.done_at[slots] = np.where(np.isfinite(self.life[slots]),
+                                       np.ceil(done_at / RECYCLE_TICKS) * RECYCLE_TICKS, done_at)
+
+    def start(self, slots):
+        """Puts particles back at the start of their emitter with a new speed."""
+        shape = (2, len(slots))
+        low = self.spawn_low[:, slots]
+        self.position[:, slots] = low + (self.spawn_high[:, slots] - low) * self.rng.random(shape)
+        low = self.speed_low[:, slots]
+        self.step[:, slots] = (low + (self.speed_high[:, slots] - low) * self.rng.random(shape)) * self.tick_scale
+        self.done_at[slots] = self.fall_time(slots)
+
+    def update_particles(self):
+        """Moves every particle for one tick and starts the ones that are done again."""
+        self.position += self.step
+        self.ticks += 1
+        if self.ticks < self.soonest:  # most ticks no particle is done, so only the move above is needed
+            return
+        done = np.flatnonzero(self.done_at <= self.ticks)
+        self.start(done)
+        # they start moving right away, like the leaves always did
+        self.position[:, done] += self.step[:, done]
+        self.done_at[done] -= 1
+        self.batch(done)
+        self.soonest = float(self.done_at.min())
+
+    def draw_particles(self, surface, distanceFromCamera=(0, 0), blend=1.0):
+        """Draws the particles the camera sees, blend of the way between the last tick and the current one."""
+        if self.few:
+            self.draw_few(surface, distanceFromCamera, blend)
+            return
+        # every particle goes in a straight line between two ticks, so where it was drawn is found from its step
+        camera = [[distanceFromCamera[0]], [distanceFromCamera[1]]]
+        screen = (self.position - self.step * (1 - blend) - camera).astype(int)
+        width, height = surface.get_size()
+        visible = np.flatnonzero(((screen + self.size > 0) & (screen < [[width], [height]])).all(axis=0))
+        if len(self.groups) == 1:
+            bounds = [0, len(visible)]
+        else:
+            bounds = np.searchsorted(visible, [group[3] for group in self.groups] + [len(self.done_at)])
+        for number, (picture, colour, size, first, end) in enumerate(self.groups):
+            slots = visible[bounds[number]:bounds[number + 1]]
+            if not len(slots):
+                continue
+            x, y = screen[:, slots]
+            if picture is not None:
+                surface.blits([(picture, position) for position in zip(x.tolist(), y.tolist())], doreturn=False)
+            elif surface.get_bytesize() == 4:
+                # all the squares are written into the pixels at once instead of blitting them one by one
+                inside = (x >= 0) & (x <= width - size) & (y >= 0) & (y <= height - size)
+                pixels = pygame.surfarray.pixels2d(surface)
+                mapped = surface.map_rgb(colour)
+                for offset_x in range(size):
+                    for offset_y in range(size):
+                        pixels[x[inside] + offset_x, y[inside] + offset_y] = mapped
+                del pixels  # unlocks the surface
+                # the squares cut by the edge of the surface are clipped by fill
+                for position in zip(x[~inside].tolist(), y[~inside].tolist()):
+                    surface.fill(colour, (position, (size, size)))
+            else:
+                for position in zip(x.tolist(), y.tolist()):
+                    surface.fill(colour, (position, (size, size)))
+
+    def draw_few(self, surface, distanceFromCamera=(0, 0), blend=1.0):
+        """Draws a handful of particles in plain python, which is quicker than the arrays for a few particles."""
+        width, height = surface.get_size()
+        back = 1 - blend
+        camera_x, camera_y = distanceFromCamera
+        x_positions, y_positions = self.position.tolist()
+        x_steps, y_steps = self.step.tolist()
+        for picture, colour, size, first, end in self.groups:
+            size_x, size_y = picture.get_size() if picture is not None else (size, size)
+            positions = []
+            for x, y, step_x, step_y in zip(x_positions[first:end], y_positions[first:end], x_steps[first:end],
+                                            y_steps[first:end]):
+                x = int(x - step_x * back - camera_x)
+                y = int(y - step_y * back - camera_y)
+                if -size_x < x < width and -size_y < y < height:
+                    positions.append((x, y))
+            if picture is not None:
+                surface.blits([(picture, position) for position in positions], doreturn=False)
+            else:
+                for position in positions:
+                    surface.fill(colour, (position, (size, size)))
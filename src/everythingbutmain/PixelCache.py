@@ -0,0 +1,103 @@
+"""
+This file holds the code for the on-disk cache of converted pictures.
+Decoding a png or jpg and converting it to the format of the display is most of the time it takes to start the game.
+The PixelCache class saves the pixels of every converted picture as a raw file, named after a hash of the picture's
+path, a hash of the picture file and the pixel format of the display. The next time the game starts the raw pixels are
+read straight into a new surface, so no picture has to be decoded. When a picture file changes its hash changes too, so
+it is decoded and saved again, and the older files saved for the same path are deleted.
+
+Layout of a cached file (little endian):
+    header: magic, width, height, pitch (bytes in one row of pixels)
+    pixels: pitch * height bytes, exactly as they are in the surface
+"""
+
+import hashlib
+import os
+import struct
+import pygame
+
+PIXEL_CACHE_DIR = 'artifacts/pixelcache/'
+MAGIC = b'DJPX'
+HEADER = struct.Struct('<4sIII')
+
+
+class PixelCache:
+    def __init__(self, directory=PIXEL_CACHE_DIR):
+        """The cache keeps its files in directory."""
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def pixel_format():
+        """Describes the pixel format of the display, so a cache made for another format is not used."""
+        display = pygame.display.get_surface()
+        return '%d-%s' % (display.get_bitsize(), '-'.join('%08x' % mask for mask in display.get_masks()))
+
+    @staticmethod
+    def path_prefix(path):
+        """Gives the start of the names of every cached file saved for a picture path."""
+        return hashlib.sha1(os.path.normpath(path).encode('utf-8')).hexdigest()[:16] + '-'
+
+    def cached_path(self, path):
+        """Gives the name of the cached file for a picture file."""
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        return os.path.join(self.directory, self.path_prefix(path) + digest + '-' + self.pixel_format() + '.raw')
+
+    def remove_old(self, path, cached):
+        """Deletes the files saved for a picture path before it changed, so the cache does not keep growing."""
+        prefix = self.path_prefix(path)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name != os.path.basename(cached):
+                os.remove(os.path.join(self.directory, name))
+
+    def read(self, cached):
+        """Reads the pixels of a cached file into a surface in the format of the display, or gives None."""
+        if not os.path.exists(cached):
+            return None
+        with open(cached, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return None
+            magic, width, height, pitch = HEADER.unpack(header)
+            if magic != MAGIC or os.path.getsize(cached) != HEADER.size + pitch * height:
+                return None
+            picture = pygame.Surface((width, height), 0, pygame.display.get_surface())
+            if picture.get_pitch() != pitch:
+                return None
+            f.readinto(picture.get_view('0'))  # the pixels go straight into the surface
+        return picture
+
+    def write(self, path, cached, picture):
+        """Saves the pixels of a converted picture, replacing what was saved for its path before."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(cached, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, picture.get_width(), picture.get_height(), picture.get_pitch()))
+                f.write(picture.get_buffer().raw)
+            self.remove_old(path, cached)
+        except OSError:
+            pass  # the game still works without the cache, it only starts slower
+
+    def load(self, path, decoded=None):
+        """Gives a picture file converted to the format of the display. decoded is the picture when it was already
+        decoded (by the level prefetcher), then it only has to be converted."""
+        cached = self.cached_path(path)
+        picture = self.read(cached)
+        if picture is not None:
+            self.hits += 1
+            return picture
+        self.misses += 1
+        if decoded is None:
+            decoded = pygame.image.load(path)
+        picture = decoded.convert()
+        self.write(path, cached, picture)
+        return picture
+
+    def has(self, path):
+        """Checks if a picture file is in the cache."""
+        return os.path.exists(self.cached_path(path))
+
+
+PIXELS = PixelCache()  # shared by every part of the game
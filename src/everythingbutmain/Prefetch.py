@@ -0,0 +1,48 @@
+"""
+This file holds the code for loading the next level while the current one is played.
+The LevelPrefetcher class has one worker thread. When a level starts it asks the worker to read the map of the level
+that comes after it (see NEXT_LEVEL), decode its pictures and read its music file. When the game switches to that level
+it takes the ready-made map and music, and the pictures only have to be converted, so the switch does not stall.
+Converting the pictures and building the tile chunks still happen on the main thread, because they need the display.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from everythingbutmain.Levels import LEVEL_MUSIC, LEVEL_ASSETS, COMMON_ASSETS
+from everythingbutmain.MapFormat import load_map
+from loadingpics import ASSETS
+
+
+class LevelPrefetcher:
+    def __init__(self, resources, map_dir='src/'):
+        """A worker thread that loads levels in the background."""
+        self.resources = resources
+        self.map_dir = map_dir
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self.jobs = {}  # map -> the job loading it
+
+    def prefetch(self, currentMap):
+        """Starts loading a level in the background, unless it is already being loaded."""
+        if currentMap is None or currentMap in self.jobs:
+            return
+        self.jobs[currentMap] = self.worker.submit(self.load, currentMap)
+
+    def load(self, currentMap):
+        """Runs on the worker thread. Reads the map and the music and decodes the pictures of a level."""
+        tile_map = load_map(self.map_dir + currentMap)
+        for file in self.resources.files(COMMON_ASSETS + LEVEL_ASSETS[currentMap]):
+            ASSETS.decode(file)
+        with open(LEVEL_MUSIC[currentMap], 'rb') as f:
+            music = f.read()
+        return tile_map, music
+
+    def take(self, currentMap):
+        """Gives the (map, music bytes) of a level that was prefetched, waiting for the worker if it is not done yet.
+        Gives None when the level was not prefetched or loading it failed, then it is loaded the normal way."""
+        job = self.jobs.pop(currentMap, None)
+        if job is None:
+            return None
+        try:
+            return job.result()
+        except (OSError, ValueError, pygame.error):
+            return None
@@ -0,0 +1,105 @@
+"""
+This file holds the code for timing the parts of a frame.
+The FrameProfiler class measures how long each stage of a frame takes (drawing the background, the leaves, the NPCs,
+the tiles, the player, the bones, the enemies, reading the keys and showing the frame). The times can be shown on top
+of the game and written to a csv file one row per frame. When it is turned off every call returns right away, so it
+costs next to nothing to leave the calls in the game loop.
+"""
+
+import csv
+import time
+import pygame
+from everythingbutmain.TextCache import TEXT
+
+# the stages in the order they are shown and written
+STAGES = ['background', 'camera', 'obstacles', 'npc', 'tiles', 'avatar', 'artifacts', 'ghosts', 'banner', 'events',
+          'present', 'levels']
+SMOOTHING = 0.1  # how fast the numbers on the overlay follow the newest frame
+
+
+class FrameProfiler:
+    def __init__(self):
+        """Keeps the stage times of the current frame and a smoothed average for the overlay."""
+        self.enabled = False
+        self.overlay = False
+        self.csv_file = None
+        self.csv_writer = None
+        self.frame = 0
+        self.last = 0.0
+        self.current = dict.fromkeys(STAGES, 0.0)
+        self.average = dict.fromkeys(STAGES, 0.0)
+        self.font = None
+
+    def toggle_overlay(self):
+        """Shows or hides the stage times on the screen."""
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.csv_file is not None
+        self.last = time.perf_counter()
+
+    def start_csv(self, path):
+        """Starts writing one row of stage times per frame to a csv file."""
+        self.stop_csv()
+        self.csv_file = open(path, 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(['frame'] + STAGES + ['total'])
+        self.enabled = True
+        self.last = time.perf_counter()
+
+    def stop_csv(self):
+        """Stops writing the csv file."""
+        if self.csv_file is not None:
+            self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+        self.enabled = self.overlay
+
+    def toggle_csv(self, path):
+        """Starts or stops writing the csv file."""
+        if self.csv_file is None:
+            self.start_csv(path)
+        else:
+            self.stop_csv()
+
+    def begin(self):
+        """Starts timing a new frame."""
+        if not self.enabled:
+            return
+        for stage in STAGES:
+            self.current[stage] = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        """Adds the time since the last mark to a stage."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[stage] += now - self.last
+        self.last = now
+
+    def end(self):
+        """Finishes the frame, updates the overlay numbers and writes the csv row."""
+        if not self.enabled:
+            return
+        self.frame += 1
+        for stage in STAGES:
+            self.average[stage] += (self.current[stage] - self.average[stage]) * SMOOTHING
+        if self.csv_writer is not None:
+            times = [self.current[stage] * 1000 for stage in STAGES]
+            self.csv_writer.writerow([self.frame] + ['%.4f' % t for t in times] + ['%.4f' % sum(times)])
+
+    def draw(self, surface):
+        """Draws the average stage times in the top left corner."""
+        if not self.overlay:
+            return
+        if self.font is None:
+            self.font = TEXT.font('Arial', 9)  # the numbers change every frame, so only the font is cached
+        y = 2
+        for stage in STAGES + ['total']:
+            if stage == 'total':
+                milliseconds = sum(self.average.values()) * 1000
+            else:
+                milliseconds = self.average[stage] * 1000
+            text_surface = self.font.render('%-10s %6.2f ms' % (stage, milliseconds), True, pygame.Color('white'),
+                                            pygame.Color('black'))
+            surface.blit(text_surface, (2, y))
+            y += text_surface.get_height()
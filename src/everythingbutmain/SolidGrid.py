@@ -0,0 +1,185 @@
+"""
+This file holds the code for the collision index of the map.
+The SolidGrid class turns the tile types of the map into a flat bytearray with one flag per grid cell that says if
+the player can stand on it. It is built once when the level is loaded, so checking the tiles around the player only
+needs integer maths and no string or dictionary lookups. The rectangles it hands back come from a small pool that is
+reused on every call, so a collision check does not create any new objects.
+sweep moves a box through the grid and finds the first solid tile it runs into (the time of impact and the side that
+was hit), so fast moving things can not pass through thin platforms. Long moves are split into steps of at most one
+tile so only the few tiles around each step are looked at.
+StreamedSolidGrid answers the same questions for a map that is streamed in chunks, looking the tiles up in the map.
+"""
+
+import math
+import pygame
+
+
+class SolidGrid:
+    def __init__(self, tile_map, physics_tiles, offsets):
+        """Builds the solid flags for every tile of the map."""
+        self.tile_dimension = tile_map.tile_size
+        self.physics_tiles = physics_tiles
+        self.offsets = offsets  # the cells around a position that get checked, in the order they are checked
+        self.origin_x = tile_map.origin_x
+        self.origin_y = tile_map.origin_y
+        self.width = tile_map.width
+        self.height = tile_map.height
+        # turn every type number of the map into 1 (solid) or 0 in one go
+        table = bytearray(256)
+        for name in physics_tiles:
+            if name in tile_map.type_ids:
+                table[tile_map.type_ids[name]] = 1
+        self.cells = bytearray(bytes(tile_map.types).translate(table))
+
+        # one reusable rectangle for each cell that can be checked
+        self.rect_pool = [pygame.Rect(0, 0, self.tile_dimension, self.tile_dimension) for _ in offsets]
+        self.hits = []
+
+    def resize(self, min_x, min_y, max_x, max_y):
+        """Makes the grid cover the given tile bounds and keeps the flags already set."""
+        old = (self.cells, self.origin_x, self.origin_y, self.width, self.height)
+        self.origin_x = min_x
+        self.origin_y = min_y
+        self.width = max_x - min_x + 1
+        self.height = max_y - min_y + 1
+        self.cells = bytearray(self.width * self.height)
+        cells, origin_x, origin_y, width, height = old
+        for y in range(height):
+            start = (y + origin_y - self.origin_y) * self.width + origin_x - self.origin_x
+            self.cells[start:start + width] = cells[y * width:(y + 1) * width]
+
+    def is_solid(self, x, y):
+        """Checks if the tile at grid position (x, y) can be collided with."""
+        x -= self.origin_x
+        y -= self.origin_y
+        return 0 <= x < self.width and 0 <= y < self.height and self.cells[y * self.width + x] == 1
+
+    def set_solid(self, x, y, solid):
+        """Changes the flag of one tile, growing the grid when the tile is outside of it."""
+        if not (0 <= x - self.origin_x < self.width and 0 <= y - self.origin_y < self.height):
+            if not solid:
+                return
+            self.resize(min(x, self.origin_x), min(y, self.origin_y),
+                        max(x, self.origin_x + self.width - 1), max(y, self.origin_y + self.height - 1))
+        self.cells[(y - self.origin_y) * self.width + x - self.origin_x] = 1 if solid else 0
+
+    def sweep(self, x, y, width, height, dx, dy):
+        """Moves the box (x, y, width, height) by (dx, dy) and stops it at the first solid tile.
+        Returns the time of impact (1 when nothing was hit), the normal of the side that was hit ((0, 0) when nothing
+        was hit) and where the box ends up."""
+        steps = max(1, math.ceil(max(abs(dx), abs(dy)) / self.tile_dimension))
+        step_x = dx / steps
+        step_y = dy / steps
+        for step in range(steps):
+            start_x = x + dx * step / steps
+            start_y = y + dy * step / steps
+            time, normal, end = self.sweep_step(start_x, start_y, width, height, step_x, step_y)
+            if normal != (0, 0):
+                return (step + time) / steps, normal, end
+        return 1.0, (0, 0), (x + dx, y + dy)
+
+    def sweep_step(self, x, y, width, height, dx, dy):
+        """sweep for a move of at most one tile."""
+        size = self.tile_dimension
+        first_x = int(min(x, x + dx) // size)
+        first_y = int(min(y, y + dy) // size)
+        last_x = int((max(x, x + dx) + width) // size)
+        last_y = int((max(y, y + dy) + height) // size)
+        best_time = 1.0
+        best_normal = (0, 0)
+        best_end = (x + dx, y + dy)
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                if not self.is_solid(tile_x, tile_y):
+                    continue
+                left = tile_x * size
+                top = tile_y * size
+                # when the box starts and stops overlapping the tile on each axis
+                x_entry, x_exit = self.axis_times(x, width, dx, left, left + size)
+                y_entry, y_exit = self.axis_times(y, height, dy, top, top + size)
+                entry = max(x_entry, y_entry)
+                # boxes that already overlap the tile (entry < 0) are let out, only touching a corner is not a hit
+                if entry < 0 or entry >= best_time or entry >= min(x_exit, y_exit):
+                    continue
+                best_time = entry
+                if x_entry > y_entry:
+                    best_normal = (-1, 0) if dx > 0 else (1, 0)
+                    best_end = (left - width if dx > 0 else left + size, y + dy * entry)
+                else:
+                    best_normal = (0, -1) if dy > 0 else (0, 1)
+                    best_end = (x + dx * entry, top - height if dy > 0 else top + size)
+        return best_time, best_normal, best_end
+
+    @staticmethod
+    def axis_times(start, length, delta, low, high):
+        """Gives the times a moving segment starts and stops overlapping the segment (low, high)."""
+        if delta > 0:
+            return (low - start - length) / delta, (high - start) / delta
+        if delta < 0:
+            return (high - start) / delta, (low - start - length) / delta
+        if start + length <= low or start >= high:
+            return math.inf, -math.inf  # never overlaps
+        return -math.inf, math.inf  # always overlaps
+
+    def solid_rects(self, position):
+        """Gives the rectangles of the solid tiles around a position.
+        The list and the rectangles in it are reused by the next call, so they should not be kept around."""
+        hits = self.hits
+        hits.clear()
+        tile_x = int(position[0] // self.tile_dimension)
+        tile_y = int(position[1] // self.tile_dimension)
+        cells = self.cells
+        width = self.width
+        height = self.height
+        for offset in self.offsets:
+            x = tile_x + offset[0] - self.origin_x
+            y = tile_y + offset[1] - self.origin_y
+            if 0 <= x < width and 0 <= y < height and cells[y * width + x]:
+                rect = self.rect_pool[len(hits)]
+                rect.x = (tile_x + offset[0]) * self.tile_dimension
+                rect.y = (tile_y + offset[1]) * self.tile_dimension
+                hits.append(rect)
+        return hits
+
+
+class StreamedSolidGrid(SolidGrid):
+    def __init__(self, tile_map, physics_tiles, offsets):
+        """The solid flags of a streamed map (see ChunkedMap.py). Instead of a flag for every tile of the map it keeps
+        which type numbers are solid and looks the tiles up in the chunks that are in memory."""
+        self.tile_map = tile_map
+        self.tile_dimension = tile_map.tile_size
+        self.physics_tiles = physics_tiles
+        self.offsets = offsets
+        self.solid_types = bytearray(256)
+        self.update_types()
+        self.rect_pool = [pygame.Rect(0, 0, self.tile_dimension, self.tile_dimension) for _ in offsets]
+        self.hits = []
+
+    def update_types(self):
+        """Works out which type numbers are solid (new types can be added when tiles are changed)."""
+        for name in self.physics_tiles:
+            if name in self.tile_map.type_ids:
+                self.solid_types[self.tile_map.type_ids[name]] = 1
+
+    def is_solid(self, x, y):
+        """Checks if the tile at grid position (x, y) can be collided with."""
+        return self.solid_types[self.tile_map.type_at(x, y)] == 1
+
+    def set_solid(self, x, y, solid):
+        """The flags come from the map itself, so only new tile types have to be looked at."""
+        self.update_types()
+
+    def solid_rects(self, position):
+        """Gives the rectangles of the solid tiles around a position.
+        The list and the rectangles in it are reused by the next call, so they should not be kept around."""
+        hits = self.hits
+        hits.clear()
+        tile_x = int(position[0] // self.tile_dimension)
+        tile_y = int(position[1] // self.tile_dimension)
+        for offset in self.offsets:
+            if self.is_solid(tile_x + offset[0], tile_y + offset[1]):
+                rect = self.rect_pool[len(hits)]
+                rect.x = (tile_x + offset[0]) * self.tile_dimension
+                rect.y = (tile_y + offset[1]) * self.tile_dimension
+                hits.append(rect)
+        return hits
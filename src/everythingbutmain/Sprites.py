@@ -16,9 +16,11 @@ class Avatar:
         self.maingame = maingame  # Reference to the Game instance
         self.avatar_type = avatar_type  # Set the type of the player entity
         self.position = list(position)  # Initialize the player's position as a list
+        self.previous_position = list(position)  # Position at the tick before, used to draw between ticks
         self.size = size  # Set the player's size
         self.avatar_velocity = [0, 0]  # Initialize the player's velocity
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}  # Collision status
+        self.contacts = []  # (time of impact, normal) of every tile hit in the last update when moving continuously
 
         self.gesture = gesture
         try:
@@ -53,10 +55,46 @@ class Avatar:
     def update_avatar(self, tilemap, movement=(0, 0)):
         """Function to update the player's state."""
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}  # Reset collision status
+        self.previous_position = list(self.position)  # Remember where the player was for drawing between ticks
+        tick_scale = self.maingame.tick_scale  # The speeds are per 1/60 s, a tick can be longer or shorter
 
         # Calculate movement based on user input and velocity
-        frame_movement = (movement[0] + self.avatar_velocity[0], movement[1] + self.avatar_velocity[1])
+        frame_movement = ((movement[0] + self.avatar_velocity[0]) * tick_scale,
+                          (movement[1] + self.avatar_velocity[1]) * tick_scale)
 
+        if self.maingame.continuous_collision:  # Sweep the player through the tiles so it can not skip over them
+            self.move_swept(frame_movement)
+        else:
+            self.move_and_push_out(frame_movement)
+
+        # Update the player's facing direction based on movement
+        if movement[0] > 0:
+            self.rotate = False  # Not flipped when moving right
+        if movement[0] < 0:
+            self.rotate = True  # Flipped when moving left
+
+        self.avatar_velocity[1] = min(4, self.avatar_velocity[1] + 0.1 * tick_scale)  # Increase downward velocity, capping at 4
+
+        # Reset vertical velocity when colliding with ground or ceiling
+        if self.collisions['down'] or self.collisions['up']:
+            self.avatar_velocity[1] = 0
+        self.airBourne += tick_scale  # Increment air time
+        if self.collisions['down']:  # Reset air time if on the ground
+            self.airBourne = 0
+
+        # Set player's action based on state
+        if self.airBourne > 4:  # If in the air for too long, set action to jump
+            self.set_gesture('jump')
+        elif movement[0] != 0:  # If moving horizontally, set action to run
+            self.set_gesture('run')
+
+        else:  # Otherwise, set action to idle
+            self.set_gesture('idle')
+
+        self.sprite.advance(tick_scale)  # Update the current animation frame
+
+    def move_and_push_out(self, frame_movement):
+        """Function to move the player and push it out of the tiles it ended up in."""
         self.position[0] += frame_movement[0]  # Update the player's horizontal position
         entity_rect = self.rect()  # Get the player's collision rectangle
         for rect in self.maingame.physics_rectangles(
@@ -83,47 +121,45 @@ class Avatar:
                     self.collisions['up'] = True  # Set up collision status
                 self.position[1] = entity_rect.y  # Update the player's position
 
-        # Update the player's facing direction based on movement
-        if movement[0] > 0:
-            self.rotate = False  # Not flipped when moving right
-        if movement[0] < 0:
-            self.rotate = True  # Flipped when moving left
-
-        self.avatar_velocity[1] = min(4, self.avatar_velocity[1] + 0.1)  # Increase downward velocity, capping at 4
-
-        # Reset vertical velocity when colliding with ground or ceiling
-        if self.collisions['down'] or self.collisions['up']:
-            self.avatar_velocity[1] = 0
-        self.airBourne += 1  # Increment air time
-        if self.collisions['down']:  # Reset air time if on the ground
-            self.airBourne = 0
-
-        # Set player's action based on state
-        if self.airBourne > 4:  # If in the air for too long, set action to jump
-            self.set_gesture('jump')
-        elif movement[0] != 0:  # If moving horizontally, set action to run
-            self.set_gesture('run')
-
-        else:  # Otherwise, set action to idle
-            self.set_gesture('idle')
-
-        self.sprite.advance()  # Update the current animation frame
+    def move_swept(self, frame_movement):
+        """Function to move the player one axis at a time, stopping it at the first tile it would run into."""
+        self.contacts = []
+        solid_grid = self.maingame.solid_grid
+        time, normal, end = solid_grid.sweep(self.position[0], self.position[1], self.size[0], self.size[1],
+                                             frame_movement[0], 0)
+        self.position[0] = end[0]  # Update the player's horizontal position
+        if normal != (0, 0):
+            self.contacts.append((time, normal))
+            self.collisions['right' if normal[0] < 0 else 'left'] = True  # Set right or left collision status
+
+        time, normal, end = solid_grid.sweep(self.position[0], self.position[1], self.size[0], self.size[1],
+                                             0, frame_movement[1])
+        self.position[1] = end[1]  # Update the player's vertical position
+        if normal != (0, 0):
+            self.contacts.append((time, normal))
+            self.collisions['down' if normal[1] < 0 else 'up'] = True  # Set down or up collision status
 
     def update_NPC(self):
         """Function to go through the sprite of the NPC."""
-        self.sprite.advance()
+        self.sprite.advance(self.maingame.tick_scale)
 
-    def render(self, surf, offset=(0, 0)):
+    def render(self, surf, offset=(0, 0), blend=1.0):
         """Function to render the player on a given surface with an offset"""
-        surf.blit(pygame.transform.flip(self.sprite.current_image(), self.rotate, False),
-                  (self.position[0] - offset[0] + self.distance[0],
-                   self.position[1] - offset[1] + self.distance[1]))  # Position the image with the offset
+        # Draw the player blend of the way from the last tick's position to the current one
+        x = self.previous_position[0] + (self.position[0] - self.previous_position[0]) * blend
+        y = self.previous_position[1] + (self.position[1] - self.previous_position[1]) * blend
+        surf.blit(self.sprite.current_image(self.rotate),
+                  (x - offset[0] + self.distance[0],
+                   y - offset[1] + self.distance[1]))  # Position the image with the offset
 
 
 class AnimationSequence:
-    def __init__(self, frames, duration_per_frame=5, is_looping=True):
+    def __init__(self, frames, duration_per_frame=5, is_looping=True, flipped_frames=None):
         """Allows us to have animation in our game."""
         self.frames = frames  # Store the list of images for the animation
+        if flipped_frames is None:  # Mirror the images once here instead of every time they are drawn
+            flipped_frames = [pygame.transform.flip(frame, True, False) for frame in frames]
+        self.flipped_frames = flipped_frames  # The same images facing left
         self.is_looping = is_looping  # Whether the animation should loop
         self.duration_per_frame = duration_per_frame  # Duration of each image frame in the animation
         self.is_complete = False  # Whether the animation has finished
@@ -131,22 +167,23 @@ class AnimationSequence:
 
     def duplicate(self):
         """Function to copy the animation (for state management)"""
-        return AnimationSequence(self.frames, self.duration_per_frame,
-                                 self.is_looping)  # Return a new instance of the Animation class
+        return AnimationSequence(self.frames, self.duration_per_frame, self.is_looping,
+                                 self.flipped_frames)  # Return a new instance of the Animation class sharing the images
 
-    def advance(self):
-        """Function to update the animation frame."""
+    def advance(self, steps=1):
+        """Function to update the animation frame. steps is how many 1/60 s the animation moves on."""
         if self.is_looping:  # If the animation should loop
-            self.current_frame_index = (self.current_frame_index + 1) % (
+            self.current_frame_index = (self.current_frame_index + steps) % (
                         self.duration_per_frame * len(self.frames))  # Loop through frames
         else:  # If the animation should not loop
-            self.current_frame_index = min(self.current_frame_index + 1, self.duration_per_frame * len(
+            self.current_frame_index = min(self.current_frame_index + steps, self.duration_per_frame * len(
                 self.frames) - 1)  # Advance frame but cap at the last frame
             if self.current_frame_index >= self.duration_per_frame * len(
                     self.frames) - 1:  # If the last frame is reached
                 self.is_complete = True  # Mark the animation as done
 
-    def current_image(self):
+    def current_image(self, flipped=False):
         """Function to get the current image frame for rendering."""
-        return self.frames[
+        frames = self.flipped_frames if flipped else self.frames  # Pick the left facing images when flipped
+        return frames[
             int(self.current_frame_index / self.duration_per_frame)]  # Return the current image frame based on the current frame index and image duration
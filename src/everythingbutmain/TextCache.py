@@ -0,0 +1,50 @@
+"""
+This file holds the code for drawing text without rasterizing it again every frame.
+The TextCache class keeps every font it has made and the surfaces of the text it has rendered, keyed by the font,
+the size, the text and the colour. Text that is drawn every frame (the NPC messages, the banner and the menu) is only
+rendered the first time, after that the same surface is blitted again. When there are more than TEXT_CACHE_LIMIT
+surfaces the one that was used the longest time ago is thrown away.
+"""
+
+from collections import OrderedDict
+import pygame
+
+TEXT_CACHE_LIMIT = 256  # rendered text surfaces kept at most
+
+
+class TextCache:
+    def __init__(self, limit=TEXT_CACHE_LIMIT):
+        """An empty cache of fonts and rendered text."""
+        self.limit = limit
+        self.fonts = {}  # (name, size, bold) -> font
+        self.surfaces = OrderedDict()  # (name, size, bold, text, colour, background) -> surface, oldest first
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name, size, bold=False):
+        """Gives a system font, making it the first time it is asked for."""
+        key = (name, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size, bold=bold)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, name, size, colour, bold=False, background=None):
+        """Gives the surface of a line of text, rendering it only the first time."""
+        key = (name, size, bold, text, tuple(pygame.Color(colour)),
+               tuple(pygame.Color(background)) if background is not None else None)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.font(name, size, bold).render(text, True, colour, background)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.limit:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+TEXT = TextCache()  # the one cache used by the whole game
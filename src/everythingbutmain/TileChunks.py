@@ -0,0 +1,105 @@
+"""
+This file holds the code for the baked tile layer.
+The TileChunks class groups the tiles of the map into square chunks and draws every chunk onto its own surface once
+when the level is loaded. Rendering the map then only takes one blit for each chunk the camera can see instead of one
+blit for every tile. When a tile changes its chunk is marked as dirty and gets drawn again the next time it is needed.
+For a streamed map (see ChunkedMap.py) the chunks are only baked when the camera gets near them, and the baked chunks
+that were not drawn for the longest time are thrown away when there are more than the map keeps in memory.
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+CHUNK_TILES = 16  # width and height of a chunk in tiles
+
+
+class TileChunks:
+    def __init__(self, tile_map, resources, chunk_tiles=CHUNK_TILES):
+        """Bakes every tile of the map into chunk surfaces."""
+        self.tile_map = tile_map
+        self.resources = resources
+        self.tile_dimension = tile_map.tile_size
+        self.chunk_tiles = chunk_tiles
+        self.chunk_pixels = self.tile_dimension * chunk_tiles
+        self.surfaces = OrderedDict()  # (chunk x, chunk y) -> baked surface (None for an empty streamed chunk)
+        self.dirty = set()  # chunks that have to be baked again before they are drawn
+        self.reach = 0  # how far (in pixels) the biggest tile sticks out of its chunk
+        self.streamed = tile_map.streamed
+        if self.streamed:
+            self.limit = tile_map.max_chunks
+            self.reach = self.chunk_pixels  # not known before the chunks are baked, so one chunk around is drawn
+            return
+
+        chunks = {}
+        for tile in self.tile_map.tiles():
+            chunks.setdefault(self.chunk_of(tile[0], tile[1]), []).append(tile)
+        for chunk, tiles in chunks.items():
+            self.bake(chunk, tiles)
+
+    def chunk_of(self, x, y):
+        """Finds the chunk a tile position belongs to."""
+        return x // self.chunk_tiles, y // self.chunk_tiles
+
+    def chunk_tiles_at(self, chunk):
+        """Collects the tiles of one chunk from the map as (x, y, type, variant)."""
+        tiles = []
+        for x in range(chunk[0] * self.chunk_tiles, (chunk[0] + 1) * self.chunk_tiles):
+            for y in range(chunk[1] * self.chunk_tiles, (chunk[1] + 1) * self.chunk_tiles):
+                tile = self.tile_map.get(x, y)
+                if tile is not None:
+                    tiles.append((x, y, tile[0], tile[1]))
+        return tiles
+
+    def bake(self, chunk, tiles=None):
+        """Draws the tiles of one chunk onto a single surface."""
+        if tiles is None:
+            tiles = self.chunk_tiles_at(chunk)
+        if not tiles:
+            self.surfaces.pop(chunk, None)
+            if self.streamed:
+                self.surfaces[chunk] = None  # remembered so it is not looked at again every frame
+            return
+
+        origin = (chunk[0] * self.chunk_pixels, chunk[1] * self.chunk_pixels)
+        width, height = self.chunk_pixels, self.chunk_pixels
+        placed = []
+        for x, y, type_name, variant in tiles:
+            image = self.resources[type_name][variant]
+            position = (x * self.tile_dimension - origin[0], y * self.tile_dimension - origin[1])
+            # tiles bigger than one cell (like the large decor) make the chunk surface grow to fit them
+            width = max(width, position[0] + image.get_width())
+            height = max(height, position[1] + image.get_height())
+            placed.append((image, position))
+        self.reach = max(self.reach, width - self.chunk_pixels, height - self.chunk_pixels)
+
+        baked = pygame.Surface((width, height))
+        baked.blits(placed, doreturn=False)
+        baked.set_colorkey((0, 0, 0), pygame.RLEACCEL)  # same see-through colour as load_picture
+        self.surfaces[chunk] = baked
+
+    def invalidate(self, x, y):
+        """Marks the chunk holding the tile at (x, y) so it gets baked again."""
+        self.dirty.add(self.chunk_of(x, y))
+
+    def draw(self, surface, offset=(0, 0)):
+        """Blits the chunks that overlap the camera."""
+        while self.dirty:
+            self.bake(self.dirty.pop())
+
+        first_x = (offset[0] - self.reach) // self.chunk_pixels
+        first_y = (offset[1] - self.reach) // self.chunk_pixels
+        last_x = (offset[0] + surface.get_width()) // self.chunk_pixels
+        last_y = (offset[1] + surface.get_height()) // self.chunk_pixels
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                if self.streamed:
+                    if (x, y) not in self.surfaces:
+                        self.bake((x, y))
+                    self.surfaces.move_to_end((x, y))
+                baked = self.surfaces.get((x, y))
+                if baked is not None:
+                    surface.blit(baked, (x * self.chunk_pixels - offset[0], y * self.chunk_pixels - offset[1]))
+        if self.streamed:
+            while len(self.surfaces) > self.limit:
+                self.surfaces.popitem(last=False)
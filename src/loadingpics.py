@@ -1,21 +1,166 @@
 import pygame
 import os
+import threading
+from collections import OrderedDict
+from everythingbutmain.Atlas import ATLAS_DIR, load_manifest
+from everythingbutmain.PixelCache import PIXELS
 
 BASE_IMAGE_DIR = 'artifacts/images/'
+CACHE_LIMIT_BYTES = 64 * 1024 * 1024  # how much picture memory the cache keeps before it starts evicting
+
+
+def surface_bytes(picture):
+    """Gives how much memory the pixels of a picture take."""
+    if picture.get_parent() is not None:  # a part of an atlas sheet only counts its own pixels
+        return picture.get_width() * picture.get_height() * picture.get_bytesize()
+    return picture.get_pitch() * picture.get_height()
+
+
+class AssetCache:
+    def __init__(self, limit_bytes=CACHE_LIMIT_BYTES):
+        """Keeps loaded pictures by path so they are only decoded once and shared by everything that uses them."""
+        self.limit_bytes = limit_bytes
+        self.pictures = OrderedDict()  # least recently used picture first
+        self.listings = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+        self.atlas = None  # the manifest of the atlas, read the first time a picture is loaded
+        self.sheets = {}  # sheet number -> loaded sheet of the atlas
+        self.decoded = {}  # path -> picture decoded ahead of time by the level prefetcher, not converted yet
+        self.lock = threading.Lock()  # the prefetcher only adds to decoded while no picture is being added
+
+    def from_atlas(self, file):
+        """Gives a picture as a part of an atlas sheet, or None when it is not in the atlas (see build_atlas.py)."""
+        if self.atlas is None:
+            self.atlas = load_manifest() or {'sheets': [], 'pictures': {}}
+        entry = self.atlas['pictures'].get(file)
+        if entry is None:
+            return None
+        sheet, x, y, width, height, modified = entry
+        if os.path.getmtime(BASE_IMAGE_DIR + file) != modified:
+            return None  # the picture changed after the atlas was built
+        if sheet not in self.sheets:
+            self.sheets[sheet] = PIXELS.load(ATLAS_DIR + self.atlas['sheets'][sheet])
+            self.sheets[sheet].set_colorkey((0, 0, 0))  # the parts of the sheet share its see-through colour
+        return self.sheets[sheet].subsurface((x, y, width, height))
+
+    def picture(self, file):
+        """Gives the picture for a path, loading it from disk on the first request."""
+        picture = self.pictures.get(file)
+        if picture is not None:
+            self.hits += 1
+            self.pictures.move_to_end(file)
+            return picture
+        self.misses += 1
+        picture = self.from_atlas(file)
+        if picture is None:
+            # read from the pixel cache when it was converted before, otherwise decoded and converted
+            picture = PIXELS.load(BASE_IMAGE_DIR + file, self.decoded.pop(file, None))
+            picture.set_colorkey((0, 0, 0))
+        with self.lock:
+            self.pictures[file] = picture
+            self.decoded.pop(file, None)  # a decode that finished while it was loaded here is not needed any more
+        self.resident_bytes += surface_bytes(picture)
+        self.evict()
+        return picture
+
+    def decode(self, file):
+        """Reads and decodes a picture without converting it, so it can be done on another thread. The next call to
+        picture for the same path only has to convert it."""
+        if file in self.pictures or file in self.decoded:
+            return
+        if self.atlas is not None and file in self.atlas['pictures']:
+            return  # the atlas sheets are shared by every level and stay loaded
+        if PIXELS.has(BASE_IMAGE_DIR + file):
+            return  # reading it from the pixel cache is faster than decoding it
+        decoded = pygame.image.load(BASE_IMAGE_DIR + file)
+        with self.lock:
+            if file not in self.pictures:  # the main thread may have loaded it while it was decoded here
+                self.decoded[file] = decoded
+
+    def mirrored(self, file):
+        """Gives the picture for a path facing the other way. It is only flipped once."""
+        key = file + '#flipped'
+        picture = self.pictures.get(key)
+        if picture is not None:
+            self.hits += 1
+            self.pictures.move_to_end(key)
+            return picture
+        picture = pygame.transform.flip(self.picture(file), True, False)
+        self.pictures[key] = picture
+        self.resident_bytes += surface_bytes(picture)
+        self.evict()
+        return picture
+
+    def listing(self, file):
+        """Gives the sorted picture names of a folder."""
+        if file not in self.listings:
+            self.listings[file] = sorted(f for f in os.listdir(BASE_IMAGE_DIR + file)
+                                         if f.endswith('.png') or f.endswith('.jpg'))
+        return self.listings[file]
+
+    def evict(self):
+        """Drops the least recently used pictures until the cache fits in its memory limit."""
+        while self.resident_bytes > self.limit_bytes and len(self.pictures) > 1:
+            file, picture = self.pictures.popitem(last=False)
+            self.resident_bytes -= surface_bytes(picture)
+            self.evictions += 1
+
+    def stats(self):
+        """Gives the counters of the cache."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'resident_bytes': self.resident_bytes, 'pictures': len(self.pictures)}
+
+
+ASSETS = AssetCache()  # shared by every part of the game
+
+
+class LevelResources:
+    def __init__(self, loaders):
+        """The resources of the game. Each one is only loaded when the level needs it."""
+        self.loaders = loaders  # resource name -> (picture or folder, function that loads it from that path)
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            path, load = self.loaders[name]
+            self.loaded[name] = load(path)
+        return self.loaded[name]
+
+    def __contains__(self, name):
+        return name in self.loaders
+
+    def use(self, manifest):
+        """Loads the resources listed for a level and lets go of the ones it does not need."""
+        self.loaded = {name: self[name] for name in manifest}
+
+    def files(self, manifest):
+        """Gives the picture files the resources listed for a level are made from."""
+        files = []
+        for name in manifest:
+            path = self.loaders[name][0]
+            if os.path.isdir(BASE_IMAGE_DIR + path):
+                files.extend(path + '/' + img_name for img_name in ASSETS.listing(path))
+            elif path not in files:
+                files.append(path)
+        return files
 
 
 def load_picture(file):
     """Loads in only one picture."""
-    picture = pygame.image.load(BASE_IMAGE_DIR + file).convert()
-    picture.set_colorkey((0, 0, 0))
-    return picture
+    return ASSETS.picture(file)
+
+
+def load_mirrored_picture(file):
+    """Loads in one picture facing the other way."""
+    return ASSETS.mirrored(file)
 
 
 def load_pictures(file):
     """Loads in a sprite."""
     pictures = []
-    png_filesNjpg_Files = [f for f in os.listdir(BASE_IMAGE_DIR + file) if f.endswith('.png') or f.endswith('.jpg')]
-    for img_name in sorted(png_filesNjpg_Files):
+    for img_name in ASSETS.listing(file):
         pictures.append(load_picture(file + '/' + img_name))
     return pictures
-
@@ -0,0 +1,54 @@
+"""
+This file plays many games at once with random bots to measure how many steps per second the headless environment
+gives (see everythingbutmain/Environment.py). Nothing is drawn and nothing waits for the clock.
+Run it from the top folder of the project:  python src/run_agents.py --games 64
+"""
+
+import argparse
+import time
+import numpy as np
+from everythingbutmain.Environment import Environment, VectorEnvironment, ACTIONS, MAPS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play random bots in the headless environment.')
+    parser.add_argument('--games', type=int, default=16, help='games played at the same time')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (one per core by default)')
+    parser.add_argument('--steps', type=int, default=1000, help='steps taken in every game')
+    parser.add_argument('--map', default='heaven.json', choices=MAPS, help='map every game starts on')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the bones and the bots')
+    parser.add_argument('--single', action='store_true', help='play one game in this process, without workers')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.single:
+        environment = Environment(args.map, seed=args.seed)
+        environment.reset()
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            observation, reward, done, info = environment.step(rng.integers(len(ACTIONS)))
+            if done:
+                environment.reset()
+        elapsed = time.perf_counter() - start
+        print('1 game: %.0f steps per second' % (args.steps / elapsed))
+        return
+
+    environments = VectorEnvironment(args.games, args.workers, currentMap=args.map)
+    try:
+        environments.reset(seeds=[args.seed + game for game in range(args.games)])
+        rewards = np.zeros(args.games)
+        finished = 0
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            observations, reward, done, infos = environments.step(rng.integers(len(ACTIONS), size=args.games))
+            rewards += reward
+            finished += int(done.sum())
+        elapsed = time.perf_counter() - start
+    finally:
+        environments.close()
+    print('%d games on %d workers: %.0f steps per second, %d runs finished, mean reward %.2f' % (
+        args.games, len(environments.sizes), args.games * args.steps / elapsed, finished, rewards.mean()))
+
+
+if __name__ == '__main__':
+    main()